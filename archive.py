@@ -0,0 +1,308 @@
+"""
+Single-file archives of whole rehearsal libraries, for backups and moving libraries around.
+
+An archive is laid out as (all integers little endian):
+
+    header   magic "RHAR", format version, record count, offset of the index
+    records  per rehearsal: metadata JSON, transcript (UTF-8), MP3 frame index, audio,
+             units JSON (the transcript's sentences mapped to the audio)
+    index    one fixed-size entry per rehearsal: its ID and the (offset, length) of each part
+
+Version 1 archives have no units part; their units are read from the metadata.
+
+Archives are opened with mmap, so listing reads only the index and each record's metadata,
+and loading a rehearsal touches only its own pages; its audio is a memoryview into the
+mapping rather than a copy.
+
+    python archive.py export library.rhar
+    python archive.py list library.rhar
+    python archive.py import library.rhar [--overwrite]
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from mp3_index import Mp3Index, build_index
+
+_MAGIC = b"RHAR"
+_VERSION = 2
+_HEADER = struct.Struct("<4sB3xIQ")  # magic, version, record count, index offset
+# ID, then offset and length of each part, per format version
+_ENTRIES = {1: struct.Struct("<64s8Q"), 2: struct.Struct("<64s10Q")}
+_ENTRY = _ENTRIES[_VERSION]
+
+_PARTS = ("metadata", "content", "index", "audio", "units")
+
+
+class RehearsalRecord:
+    """
+    A rehearsal with its audio, without per-instance dicts or audio copies.
+
+    `audio` is a read-only memoryview, e.g. into a memory-mapped archive, and `fields`
+    holds the remaining metadata (created_at, spotify_url, units, ...).
+    """
+
+    __slots__ = ("id", "title", "content", "audio", "fields", "_index")
+
+    def __init__(self, id: str, title: str, content: str, audio, fields: Optional[dict] = None,
+                 index: Optional[Mp3Index] = None):
+        self.id = id
+        self.title = title
+        self.content = content
+        self.audio = memoryview(audio).toreadonly()
+        self.fields = fields or {}
+        self._index = index
+
+    @property
+    def index(self) -> Mp3Index:
+        """The MP3 frame index of the audio, built on first use if it was not stored."""
+        if self._index is None:
+            self._index = build_index(self.audio)
+        return self._index
+
+    def metadata(self) -> dict:
+        """Returns the rehearsal as a metadata dict in the rehearsal store's format."""
+        return {**self.fields, "id": self.id, "title": self.title, "content": self.content}
+
+    @classmethod
+    def from_store(cls, store, rehearsal_id: str) -> Optional["RehearsalRecord"]:
+        """Loads a rehearsal and its audio from a `RehearsalStore`, or returns None if it does not exist."""
+        rehearsal = store.get(rehearsal_id)
+        if rehearsal is None:
+            return None
+        audio = store.load_audio(rehearsal_id) or b""
+        fields = {name: value for name, value in rehearsal.items() if name not in ("id", "title", "content")}
+        return cls(
+            rehearsal_id, rehearsal["title"], rehearsal["content"], audio, fields,
+            store.load_index(rehearsal_id) if audio else None,
+        )
+
+
+def write_archive(path: str, records: Iterable[RehearsalRecord]) -> int:
+    """
+    Writes rehearsals to a new archive, one record at a time.
+
+    The archive is written to a temporary file and moved into place, so an existing
+    archive at `path` is only replaced once the new one is complete.
+
+    Returns:
+        int: The number of rehearsals written.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        entries = []
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(_HEADER.size))
+            for record in records:
+                key = record.id.encode("utf-8")
+                if len(key) > 64:
+                    raise ValueError(f"Rehearsal ID too long for an archive: {record.id}")
+                # Units repeat the transcript, so they stay out of the metadata that listing reads
+                fields = {name: value for name, value in record.fields.items() if name != "units"}
+                fields["title"] = record.title
+                units = record.fields.get("units")
+                parts = (
+                    json.dumps(fields).encode("utf-8"),
+                    record.content.encode("utf-8"),
+                    record.index.to_bytes(),
+                    record.audio,
+                    json.dumps(units).encode("utf-8") if units is not None else b"",
+                )
+                spans = []
+                for part in parts:
+                    spans += [f.tell(), len(part)]
+                    f.write(part)
+                entries.append(_ENTRY.pack(key, *spans))
+            index_offset = f.tell()
+            for entry in entries:
+                f.write(entry)
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(entries), index_offset))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(entries)
+
+
+class RehearsalArchive:
+    """
+    Read-only view of an archive file, memory-mapped.
+
+    Opening reads the header and index only. Use it as a context manager, or call `close`;
+    views returned by `record` keep the mapping alive until they are released.
+
+    Args:
+        path (str): The archive file.
+
+    Raises:
+        ValueError: If the file is not a rehearsal archive, or its index points outside
+            the records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError(f"Not a rehearsal archive: {path}")
+            magic, version, count, index_offset = _HEADER.unpack(header)
+            if magic != _MAGIC or version not in _ENTRIES:
+                raise ValueError(f"Not a rehearsal archive: {path}")
+            entry = _ENTRIES[version]
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if index_offset + count * entry.size > len(self._map):
+            self._map.close()
+            raise ValueError(f"Truncated rehearsal archive: {path}")
+        self._entries: Dict[str, tuple] = {}
+        for number in range(count):
+            key, *spans = entry.unpack_from(self._map, index_offset + number * entry.size)
+            if any(offset + length > index_offset for offset, length in zip(spans[::2], spans[1::2])):
+                self._map.close()
+                raise ValueError(f"Corrupt rehearsal archive: {path}")
+            self._entries[key.rstrip(b"\0").decode("utf-8")] = tuple(spans)
+
+    def __enter__(self) -> "RehearsalArchive":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps the archive; if records are still in use it is unmapped once they are released."""
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, rehearsal_id: str) -> bool:
+        return rehearsal_id in self._entries
+
+    def ids(self) -> List[str]:
+        """Returns the rehearsal IDs in archive order."""
+        return list(self._entries)
+
+    def _part(self, rehearsal_id: str, part: str) -> memoryview:
+        spans = self._entries[rehearsal_id]
+        number = _PARTS.index(part)
+        if 2 * number >= len(spans):
+            # Not in this archive's format version
+            return memoryview(b"")
+        offset, length = spans[2 * number], spans[2 * number + 1]
+        if offset + length > len(self._map):
+            raise ValueError(f"The {part} of {rehearsal_id} lies outside the archive: {self.path}")
+        return memoryview(self._map)[offset:offset + length]
+
+    def _fields(self, rehearsal_id: str) -> dict:
+        with self._part(rehearsal_id, "metadata") as data:
+            return json.loads(bytes(data))
+
+    def metadata(self, rehearsal_id: str) -> dict:
+        """Returns a rehearsal's metadata without its transcript, reading only that record's metadata."""
+        fields = self._fields(rehearsal_id)
+        fields.pop("units", None)  # only in version 1 archives
+        return {**fields, "id": rehearsal_id}
+
+    def list(self) -> List[dict]:
+        """Returns the metadata of every rehearsal, without transcripts or audio."""
+        return [self.metadata(rehearsal_id) for rehearsal_id in self._entries]
+
+    def record(self, rehearsal_id: str) -> Optional[RehearsalRecord]:
+        """Returns one rehearsal with its audio as a view into the archive, or None if it is not in it."""
+        if rehearsal_id not in self._entries:
+            return None
+        fields = self._fields(rehearsal_id)
+        title = fields.pop("title")
+        with self._part(rehearsal_id, "content") as data:
+            content = str(data, "utf-8")
+        with self._part(rehearsal_id, "index") as data:
+            index = Mp3Index.from_bytes(data) if len(data) else None
+        with self._part(rehearsal_id, "units") as data:
+            if len(data):
+                fields["units"] = json.loads(bytes(data))
+        return RehearsalRecord(rehearsal_id, title, content, self._part(rehearsal_id, "audio"), fields, index)
+
+    def __iter__(self) -> Iterator[RehearsalRecord]:
+        for rehearsal_id in self._entries:
+            yield self.record(rehearsal_id)
+
+
+def export_library(path: str, store=None, rehearsal_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Exports rehearsals from the rehearsal store to an archive, loading one rehearsal at a time.
+
+    Args:
+        path (str): The archive to write.
+        store: The `RehearsalStore`; defaults to the process-wide store.
+        rehearsal_ids: The rehearsals to export; defaults to the whole library.
+
+    Returns:
+        int: The number of rehearsals exported.
+    """
+    if store is None:
+        from rehearsal_store import get_rehearsal_store
+
+        store = get_rehearsal_store()
+    if rehearsal_ids is None:
+        rehearsal_ids = [rehearsal["id"] for rehearsal in store.list()]
+    records = (RehearsalRecord.from_store(store, rehearsal_id) for rehearsal_id in rehearsal_ids)
+    return write_archive(path, (record for record in records if record is not None))
+
+
+def import_archive(path: str, store=None, overwrite: bool = False) -> int:
+    """
+    Imports the rehearsals in an archive into the rehearsal store.
+
+    Args:
+        path (str): The archive to read.
+        store: The `RehearsalStore`; defaults to the process-wide store.
+        overwrite (bool): Replace rehearsals that already exist instead of skipping them.
+
+    Returns:
+        int: The number of rehearsals imported.
+    """
+    if store is None:
+        from rehearsal_store import get_rehearsal_store
+
+        store = get_rehearsal_store()
+    imported = 0
+    with RehearsalArchive(path) as archive:
+        for rehearsal_id in archive.ids():
+            if not overwrite and store.get(rehearsal_id) is not None:
+                continue
+            record = archive.record(rehearsal_id)
+            with record.audio:
+                store.add(record.metadata(), record.audio, record.index)
+            imported += 1
+    return imported
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "import", "list"))
+    parser.add_argument("archive", help="the archive file")
+    parser.add_argument("--overwrite", action="store_true", help="on import, replace existing rehearsals")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        print(f"Exported {export_library(args.archive)} rehearsals to {args.archive}")
+    elif args.command == "import":
+        print(f"Imported {import_archive(args.archive, overwrite=args.overwrite)} rehearsals from {args.archive}")
+    else:
+        with RehearsalArchive(args.archive) as archive:
+            for rehearsal in archive.list():
+                print(f"{rehearsal['id']}  {rehearsal.get('created_at', '')}  {rehearsal['title']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
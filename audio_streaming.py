@@ -0,0 +1,338 @@
+import os
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+
+from chunk_buffer import ChunkBuffer
+
+load_dotenv()
+
+AUDIO_SERVER_HOST = os.getenv("AUDIO_SERVER_HOST", "127.0.0.1")
+AUDIO_SERVER_PORT = int(os.getenv("AUDIO_SERVER_PORT", "8502"))
+# The URL the browser reaches the server at. Unset by default: a hosted app's browser
+# cannot reach a port on the server, so audio is then sent through Streamlit instead
+AUDIO_SERVER_PUBLIC_URL = os.getenv("AUDIO_SERVER_PUBLIC_URL", "")
+AUDIO_STREAM_TTL = int(os.getenv("AUDIO_STREAM_TTL", "900"))  # seconds a finished stream stays servable
+# `file_url` puts the file's version in the URL, so a cached response is never stale:
+# regenerated audio gets a new URL rather than reusing the old one
+AUDIO_CACHE_CONTROL = os.getenv("AUDIO_CACHE_CONTROL", "private, max-age=86400")
+
+_NAME = re.compile(r"[A-Za-z0-9_-]+")
+# How often finished streams past their TTL are dropped, even if nobody registers or plays one
+_SWEEP_INTERVAL = max(1, min(60, AUDIO_STREAM_TTL))
+_SEND_BLOCK_SIZE = 64 * 1024
+
+
+def _rehearsal_audio_path(rehearsal_id: str) -> Optional[str]:
+    from rehearsal_store import get_rehearsal_store
+
+    return get_rehearsal_store().audio_path(rehearsal_id)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range `Range: bytes=...` header.
+
+    Returns:
+        Tuple[int, int]: The inclusive (first, last) byte positions, or None when the header
+            is absent or not a single byte range (the whole file is sent then).
+
+    Raises:
+        ValueError: If the range cannot be satisfied for a file of `size` bytes.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(0, size - length), size - 1
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        raise ValueError(f"Malformed range {header!r}")
+    if first >= size or first > last:
+        raise ValueError(f"Range {header!r} not satisfiable for {size} bytes")
+    return first, last
+
+
+class _AudioRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _route(self):
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) != 2 or not _NAME.fullmatch(parts[1].removesuffix(".mp3")):
+            return None, None
+        return parts[0], parts[1].removesuffix(".mp3")
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] == "/metrics":
+            self._send_metrics()
+            return
+        kind, name = self._route()
+        if kind == "stream":
+            self._send_stream(name)
+        elif kind == "audio":
+            self._send_file(name)
+        else:
+            self.send_error(404)
+
+    def do_HEAD(self):
+        kind, name = self._route()
+        if kind == "audio":
+            self._send_file(name, head=True)
+        else:
+            self.send_error(404)
+
+    def _send_metrics(self):
+        import metrics
+
+        exposition = metrics.render()
+        if exposition is None:
+            self.send_error(404, "Metrics are disabled (set METRICS_SINK=prometheus)")
+            return
+        body = exposition.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, rehearsal_id: str, head: bool = False):
+        path = self.server.audio_server.resolve_file(rehearsal_id)
+        try:
+            f = open(path, "rb")
+        except (FileNotFoundError, TypeError):
+            self.send_error(404)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{stat.st_ino:x}-{size:x}-{stat.st_mtime_ns:x}"'
+
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", AUDIO_CACHE_CONTROL)
+                self.end_headers()
+                return
+
+            byte_range = None
+            if_range = self.headers.get("If-Range")
+            if if_range is None or if_range == etag:
+                try:
+                    byte_range = parse_range(self.headers.get("Range"), size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+            first, last = byte_range or (0, size - 1)
+            length = max(0, last - first + 1)
+            self.send_response(206 if byte_range else 200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", self.date_time_string(int(stat.st_mtime)))
+            self.send_header("Cache-Control", AUDIO_CACHE_CONTROL)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {first}-{last}/{size}")
+            self.end_headers()
+            if head:
+                return
+
+            try:
+                f.seek(first)
+                remaining = length
+                while remaining > 0:
+                    block = f.read(min(_SEND_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    self.wfile.write(block)
+                    remaining -= len(block)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    def _send_stream(self, token: str):
+        source = self.server.audio_server.get_stream(token)
+        if source is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        try:
+            if not isinstance(source, ChunkBuffer):
+                # Produced for this request only, as fast as the player reads it
+                chunks = source()
+            elif source.done and source.error is None:
+                audio = source.getvalue()
+                self.send_header("Content-Length", str(len(audio)))
+                self.end_headers()
+                self.wfile.write(audio)
+                return
+            else:
+                chunks = source.iter_chunks()
+
+            # Still producing: relay chunks as they arrive
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for chunk in chunks:
+                    if chunk:
+                        self.wfile.write(b"%X\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception:
+                # The audio failed mid-stream; drop the connection so the player stops
+                self.close_connection = True
+                return
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AudioStreamServer:
+    """
+    Small local HTTP server for audio.
+
+    It serves these URLs:
+
+    - `/stream/<token>.mp3` plays a ChunkBuffer while it is still being captured, or a
+      chunk source produced on request.
+    - `/audio/<rehearsal_id>.mp3` serves stored rehearsals with Range, ETag and caching
+      headers, so the browser fetches and caches the audio itself and seeks with small
+      range requests instead of Streamlit resending the whole file on every rerun.
+    - `/metrics` exposes pipeline metrics in the Prometheus text format when
+      `METRICS_SINK=prometheus`.
+    """
+
+    def __init__(self, host: str = AUDIO_SERVER_HOST, port: int = AUDIO_SERVER_PORT,
+                 public_url: str = None,
+                 resolve_file: Callable[[str], Optional[str]] = None):
+        self.resolve_file = resolve_file or _rehearsal_audio_path
+        self._streams = {}  # token -> (buffer or chunk source, registered_at)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.httpd = ThreadingHTTPServer((host, port), _AudioRequestHandler)
+        self.public_url = (public_url or f"http://localhost:{self.httpd.server_port}").rstrip("/")
+        self.httpd.daemon_threads = True
+        self.httpd.audio_server = self
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="audio-server", daemon=True
+        )
+        self._thread.start()
+        threading.Thread(target=self._sweep, name="audio-stream-sweep", daemon=True).start()
+
+    def register(self, buffer: ChunkBuffer) -> str:
+        """
+        Makes a buffer available to the player.
+
+        Returns:
+            str: The URL the browser can stream the audio from.
+        """
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self._streams[token] = (buffer, time.monotonic())
+        return f"{self.public_url}/stream/{token}.mp3"
+
+    def register_source(self, open_chunks: Callable[[], Iterable[bytes]]) -> str:
+        """
+        Makes audio produced on request available to the player.
+
+        Unlike `register`, nothing is buffered: each request calls `open_chunks` and relays
+        its chunks as the player reads them, so a slow listener holds back production
+        instead of the whole audio piling up in memory.
+
+        Returns:
+            str: The URL the browser can stream the audio from.
+        """
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self._streams[token] = (open_chunks, time.monotonic())
+        return f"{self.public_url}/stream/{token}.mp3"
+
+    def file_url(self, rehearsal_id: str) -> Optional[str]:
+        """
+        Returns the URL that serves a stored rehearsal's audio, or None if it has no audio file.
+
+        The URL carries the file's version, so the browser fetches regenerated audio instead
+        of playing the copy it cached for the old version.
+        """
+        path = self.resolve_file(rehearsal_id)
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, TypeError):
+            return None
+        return f"{self.public_url}/audio/{rehearsal_id}.mp3?v={stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def get_stream(self, token: str) -> Optional[Union[ChunkBuffer, Callable[[], Iterable[bytes]]]]:
+        with self._lock:
+            self._expire()
+            entry = self._streams.get(token)
+        return entry[0] if entry else None
+
+    def _sweep(self):
+        while not self._stopped.wait(_SWEEP_INTERVAL):
+            with self._lock:
+                self._expire()
+
+    def _expire(self):
+        # Must be called with the lock held
+        now = time.monotonic()
+        for token, (source, registered_at) in list(self._streams.items()):
+            finished = source.done if isinstance(source, ChunkBuffer) else True
+            if finished and now - registered_at > AUDIO_STREAM_TTL:
+                del self._streams[token]
+
+    def shutdown(self):
+        self._stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_audio_server() -> AudioStreamServer:
+    """Returns the process-wide audio server, starting it on first use."""
+    global _server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                _server = AudioStreamServer(public_url=AUDIO_SERVER_PUBLIC_URL)
+    return _server
+
+
+def get_browser_audio_server() -> Optional[AudioStreamServer]:
+    """
+    Returns the audio server if the browser can reach it, i.e. `AUDIO_SERVER_PUBLIC_URL`
+    is set, starting it on first use; otherwise returns None.
+    """
+    if not AUDIO_SERVER_PUBLIC_URL:
+        return None
+    return get_audio_server()
@@ -0,0 +1,232 @@
+"""
+Pre-render many rehearsals from a JSONL or CSV file.
+
+Each input record needs a `text` field and may have an `id`; without one the id is derived
+from a hash of the text. Progress is appended to a manifest, so re-running the same command
+after an interruption only renders what is not done yet:
+
+    python batch_render.py prompts.jsonl --concurrency 8 --output-dir renders
+    python batch_render.py prompts.csv --s3
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+DONE = "done"
+FAILED = "failed"
+
+# Ids become file names, so they must not contain path separators or start with a dot
+_ID = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9._-]{0,127}")
+
+
+def read_prompts(path: str) -> List[dict]:
+    """
+    Reads prompts from a JSONL or CSV file (chosen by extension).
+
+    Args:
+        path (str): The input file.
+
+    Returns:
+        List[dict]: One record per prompt, each with `id` and `text`.
+
+    Raises:
+        ValueError: If an id is not a safe file name or is used by more than one prompt.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    prompts = {}
+    for record in records:
+        text = (record.get("text") or "").strip()
+        if not text:
+            continue
+        prompt_id = str(record.get("id") or "").strip()
+        if not prompt_id:
+            prompt_id = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+            if prompt_id in prompts:
+                continue  # the same text again; it would render to the same file
+        if not _ID.fullmatch(prompt_id):
+            raise ValueError(f"Invalid id {prompt_id!r}: use letters, digits, '.', '_' and '-'")
+        if prompt_id in prompts:
+            raise ValueError(f"Duplicate id {prompt_id!r}")
+        prompts[prompt_id] = {**record, "id": prompt_id, "text": text}
+    return list(prompts.values())
+
+
+class Manifest:
+    """
+    Append-only JSONL log of rendered items, flushed after every line.
+
+    The last entry for an id wins, so an item that failed and later succeeded counts as done.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def completed(self) -> Set[str]:
+        """Returns the ids whose latest entry is done."""
+        status = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line torn by an interrupted write
+                    status[entry["id"]] = entry["status"]
+        return {prompt_id for prompt_id, state in status.items() if state == DONE}
+
+    def record(self, entry: dict):
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _write_atomically(path: str, data: bytes):
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def render_prompt(prompt: dict, output_dir: str = None, upload: bool = False) -> dict:
+    """
+    Synthesizes one prompt and writes and/or uploads the audio.
+
+    Returns:
+        dict: The manifest entry for the prompt.
+    """
+    from chunked_synthesis import TTS_CHUNK_MAX_CHARS
+    from text_to_speech_stream import text_to_speech_stream
+    from tts_scheduler import BATCH
+
+    started_at = time.perf_counter()
+    chunked = len(prompt["text"]) > TTS_CHUNK_MAX_CHARS
+    audio_stream = text_to_speech_stream(prompt["text"], chunked=chunked, lane=BATCH)
+    entry = {"id": prompt["id"], "status": DONE, "bytes": len(audio_stream.getbuffer())}
+
+    if output_dir:
+        if not _ID.fullmatch(prompt["id"]):
+            raise ValueError(f"Invalid id {prompt['id']!r} for a file name")
+        entry["output"] = os.path.join(output_dir, f"{prompt['id']}.mp3")
+        _write_atomically(entry["output"], audio_stream.getbuffer())
+    if upload:
+        from s3_uploader import upload_audiostream_to_s3
+
+        audio_stream.seek(0)
+        entry["s3_key"] = upload_audiostream_to_s3(audio_stream, prompt["id"])
+
+    entry["seconds"] = round(time.perf_counter() - started_at, 3)
+    return entry
+
+
+def render_batch(
+    prompts: List[dict],
+    manifest: Manifest,
+    concurrency: int = BATCH_CONCURRENCY,
+    output_dir: str = None,
+    upload: bool = False,
+) -> Iterator[dict]:
+    """
+    Renders every prompt not yet marked done in the manifest, `concurrency` at a time.
+
+    Yields:
+        dict: The manifest entry of each finished prompt, in completion order.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    completed = manifest.completed()
+    pending = [prompt for prompt in prompts if prompt["id"] not in completed]
+
+    def finish(future) -> dict:
+        try:
+            entry = future.result()
+        except Exception as e:
+            entry = {"id": futures[future]["id"], "status": FAILED, "error": str(e)}
+        manifest.record(entry)
+        recorded.add(future)
+        return entry
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    futures = {
+        executor.submit(render_prompt, prompt, output_dir, upload): prompt
+        for prompt in pending
+    }
+    recorded = set()
+    try:
+        for future in as_completed(futures):
+            yield finish(future)
+    finally:
+        # On an interruption or error, queued prompts are dropped instead of still being
+        # rendered; the ones already rendering finish and are recorded for the next run
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures:
+            if future not in recorded and not future.cancelled():
+                finish(future)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV file with a `text` (and optional `id`) per record")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="parallel renders")
+    parser.add_argument("--output-dir", default="renders", help="where to write the MP3 files")
+    parser.add_argument("--no-files", action="store_true", help="do not write local files")
+    parser.add_argument("--s3", action="store_true", help="upload each render with upload_audiostream_to_s3")
+    parser.add_argument("--manifest", help="progress manifest (default: <input>.manifest.jsonl)")
+    args = parser.parse_args(argv)
+
+    output_dir = None if args.no_files else args.output_dir
+    if not output_dir and not args.s3:
+        parser.error("nothing to do: pass --s3 or drop --no-files")
+
+    try:
+        prompts = read_prompts(args.input)
+    except ValueError as e:
+        parser.error(str(e))
+    manifest = Manifest(args.manifest or f"{os.path.splitext(args.input)[0]}.manifest.jsonl")
+    skipped = len(manifest.completed() & {prompt["id"] for prompt in prompts})
+    print(f"{len(prompts)} prompts, {skipped} already rendered")
+
+    started_at = time.perf_counter()
+    done = failed = 0
+    for entry in render_batch(prompts, manifest, args.concurrency, output_dir, args.s3):
+        if entry["status"] == DONE:
+            done += 1
+            print(f"[{done + failed}/{len(prompts) - skipped}] {entry['id']} ({entry['seconds']}s)")
+        else:
+            failed += 1
+            print(f"[{done + failed}/{len(prompts) - skipped}] {entry['id']} FAILED: {entry['error']}")
+
+    print(f"Rendered {done}, failed {failed} in {time.perf_counter() - started_at:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
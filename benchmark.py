@@ -0,0 +1,377 @@
+"""
+End-to-end benchmark of the create-and-publish path against local stand-ins.
+
+Every simulated session synthesizes a script with `text_to_speech_chunks` (timing the first
+byte as the player would receive it), uploads it
+with `upload_audiostream_to_s3` and publishes it with `SpotifyPodcastHandler.upload_episode`.
+The three services are replaced by local fakes with configurable latency: a chunked TTS
+generator that emits real `mp3_22050_32` frames, an in-process S3 stub and an HTTP server
+standing in for the Spotify episodes endpoint. Results are written as JSON so runs can be
+compared across commits:
+
+    python benchmark.py --sessions 64 --concurrency 16 --output before.json
+    python benchmark.py --sessions 64 --concurrency 16 --compare before.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+# A silent MPEG-2 Layer III frame: 22050 Hz, 32 kbps, mono, 576 samples (~26 ms)
+_MP3_FRAME = bytes([0xFF, 0xF3, 0x40, 0xC4]) + bytes(100)
+_FRAMES_PER_SECOND = 22050 / 576
+_SPEECH_CHARS_PER_SECOND = 15
+
+
+class FakeTextToSpeech:
+    """
+    Stands in for `client.text_to_speech`: yields MP3 frames for roughly as long as the
+    text would take to read, after a first-chunk delay and with a delay between chunks.
+    """
+
+    def __init__(self, first_chunk_latency: float, chunk_interval: float, frames_per_chunk: int = 40):
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_interval = chunk_interval
+        self.frames_per_chunk = frames_per_chunk
+
+    def convert(self, text: str, **params):
+        frames = max(1, int(len(text) / _SPEECH_CHARS_PER_SECOND * _FRAMES_PER_SECOND))
+        time.sleep(self.first_chunk_latency)
+        while frames > 0:
+            count = min(frames, self.frames_per_chunk)
+            yield _MP3_FRAME * count
+            frames -= count
+            if frames:
+                time.sleep(self.chunk_interval)
+
+
+class FakeElevenLabs:
+    def __init__(self, text_to_speech: FakeTextToSpeech):
+        self.text_to_speech = text_to_speech
+
+
+class FakeS3:
+    """
+    In-process stand-in for the boto3 S3 client calls the app makes, with per-request
+    latency and a bandwidth limit.
+    """
+
+    def __init__(self, latency: float, bandwidth: float):
+        self.latency = latency
+        self.bandwidth = bandwidth  # bytes per second
+        self.objects = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _transfer(self, size: int):
+        time.sleep(self.latency + size / self.bandwidth)
+
+    def head_object(self, Bucket, Key):
+        from botocore.exceptions import ClientError
+
+        time.sleep(self.latency)
+        with self._lock:
+            if Key not in self.objects:
+                raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+            return {"ContentLength": len(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._transfer(len(Body))
+        with self._lock:
+            self.objects[Key] = bytes(Body)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        self.put_object(Bucket, Key, Fileobj.read())
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        time.sleep(self.latency)
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._transfer(len(Body))
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        time.sleep(self.latency)
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+            self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def delete_object(self, Bucket, Key):
+        time.sleep(self.latency)
+        with self._lock:
+            self.objects.pop(Key, None)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://fake-s3.local/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+class _FakeSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 64 * 1024)))
+        time.sleep(self.server.latency)
+        body = json.dumps({"id": uuid.uuid4().hex[:22]}).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FakeAuthManager:
+    def get_access_token(self, check_cache=True):
+        return {"access_token": "benchmark", "expires_at": time.time() + 3600}
+
+
+class _FakeSpotipy:
+    auth_manager = _FakeAuthManager()
+
+
+def start_fake_spotify(latency: float) -> ThreadingHTTPServer:
+    """Starts a local HTTP server that accepts episode uploads like the Spotify endpoint."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeSpotifyHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, name="fake-spotify", daemon=True).start()
+    return server
+
+
+def percentiles(samples: list) -> dict:
+    """Returns p50/p95/p99 and the mean of a list of seconds, in milliseconds."""
+    if not samples:
+        return {}
+    if len(samples) == 1:
+        p50 = p95 = p99 = samples[0]
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    return {
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(
+    sessions: int = 32,
+    concurrency: int = 8,
+    script_chars: int = 1500,
+    tts_first_chunk_latency: float = 0.3,
+    tts_chunk_interval: float = 0.02,
+    s3_latency: float = 0.02,
+    s3_bandwidth: float = 50e6,
+    spotify_latency: float = 0.1,
+    trace_memory: bool = True,
+) -> dict:
+    """
+    Runs `sessions` simulated create-and-publish sessions, `concurrency` at a time.
+
+    Returns:
+        dict: The configuration and measured results.
+    """
+    config = {name: value for name, value in locals().items()}
+
+    # Isolate the run: fresh synthesis cache and rehearsal data, fake credentials. The
+    # environment is restored and the scratch directory removed afterwards.
+    workdir = tempfile.mkdtemp(prefix="rehearsals-bench-")
+    spotify = start_fake_spotify(spotify_latency)
+    environment = {
+        "TTS_CACHE_DIR": os.path.join(workdir, "tts-cache"),
+        "REHEARSALS_DATA_DIR": os.path.join(workdir, "data"),
+        "ELEVENLABS_API_KEY": "benchmark",
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "AWS_REGION_NAME": "us-east-1",
+        "AWS_S3_BUCKET_NAME": "benchmark",
+        "SPOTIFY_CLIENT_ID": "benchmark",
+        "SPOTIFY_CLIENT_SECRET": "benchmark",
+        "SPOTIFY_SHOW_ID": "benchmark",
+        "SPOTIFY_API_BASE_URL": f"http://127.0.0.1:{spotify.server_port}/v1",
+    }
+    saved_environment = {name: os.environ.get(name) for name in environment}
+    os.environ.update(environment)
+    import clients
+
+    try:
+        from s3_uploader import upload_audiostream_to_s3
+        from spotify_handler import SpotifyPodcastHandler
+        from text_to_speech_stream import text_to_speech_chunks
+
+        tts = FakeTextToSpeech(tts_first_chunk_latency, tts_chunk_interval)
+        clients.set_client("elevenlabs", FakeElevenLabs(tts))
+        clients.set_client("s3", FakeS3(s3_latency, s3_bandwidth))
+        handler = SpotifyPodcastHandler()
+        handler._sp = _FakeSpotipy()
+
+        sentence = "Breathe in slowly and feel the ground beneath you. "
+
+        def session(number: int) -> dict:
+            # Unique text per session, so every session really synthesizes
+            text = f"Session {number} {uuid.uuid4().hex}. " + sentence * (script_chars // len(sentence))
+            started_at = time.perf_counter()
+            first_byte_at = None
+            audio_stream = BytesIO()
+            # Read the lazy stream the way the player does, so TTFB is what a listener waits
+            for chunk in text_to_speech_chunks(text, chunked=len(text) > 800):
+                if chunk:
+                    if first_byte_at is None:
+                        first_byte_at = time.perf_counter()
+                    audio_stream.write(chunk)
+            synthesized_at = time.perf_counter()
+            audio_data = audio_stream.getvalue()
+            upload_audiostream_to_s3(BytesIO(audio_data), f"bench-{number}")
+            uploaded_at = time.perf_counter()
+            episode_id = handler.upload_episode(audio_data, f"Session {number}", text)
+            published_at = time.perf_counter()
+            return {
+                "ttfb": (first_byte_at or synthesized_at) - started_at,
+                "synthesis": synthesized_at - started_at,
+                "s3_upload": uploaded_at - synthesized_at,
+                "spotify_upload": published_at - uploaded_at,
+                "total": published_at - started_at,
+                "bytes": len(audio_data),
+                "ok": episode_id is not None,
+            }
+
+        if trace_memory:
+            tracemalloc.start()
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(session, range(sessions)))
+        elapsed = time.perf_counter() - started_at
+        peak_traced = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        spotify.shutdown()
+        clients.set_client("elevenlabs", None)
+        clients.set_client("s3", None)
+        for name, value in saved_environment.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config,
+        "results": {
+            "elapsed_s": round(elapsed, 3),
+            "throughput_sessions_per_s": round(sessions / elapsed, 3),
+            "failures": sum(not result["ok"] for result in results),
+            "audio_bytes_mean": round(statistics.fmean(result["bytes"] for result in results)),
+            "ttfb": percentiles([result["ttfb"] for result in results]),
+            "synthesis": percentiles([result["synthesis"] for result in results]),
+            "s3_upload": percentiles([result["s3_upload"] for result in results]),
+            "spotify_upload": percentiles([result["spotify_upload"] for result in results]),
+            "total": percentiles([result["total"] for result in results]),
+            # Peak Python allocations while `concurrency` rehearsals were in flight
+            "peak_memory_per_rehearsal_mb": (
+                round(peak_traced / concurrency / 2**20, 3) if peak_traced is not None else None
+            ),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def compare(current: dict, baseline: dict) -> str:
+    """Formats the relative change of every latency and throughput figure against a baseline."""
+    lines = [f"{'metric':<40}{'baseline':>12}{'current':>12}{'change':>10}"]
+
+    def walk(prefix: str, now, before):
+        if isinstance(now, dict):
+            for key, value in now.items():
+                if isinstance(before, dict) and key in before:
+                    walk(f"{prefix}{key}.", value, before[key])
+        elif isinstance(now, (int, float)) and isinstance(before, (int, float)) and before:
+            change = (now - before) / before * 100
+            lines.append(f"{prefix[:-1]:<40}{before:>12}{now:>12}{change:>+9.1f}%")
+
+    walk("", current["results"], baseline["results"])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--script-chars", type=int, default=1500)
+    parser.add_argument("--tts-first-chunk-latency", type=float, default=0.3)
+    parser.add_argument("--tts-chunk-interval", type=float, default=0.02)
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    parser.add_argument("--s3-bandwidth", type=float, default=50e6, help="bytes per second")
+    parser.add_argument("--spotify-latency", type=float, default=0.1)
+    parser.add_argument("--no-trace-memory", action="store_true", help="skip tracemalloc (less overhead)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        sessions=args.sessions,
+        concurrency=args.concurrency,
+        script_chars=args.script_chars,
+        tts_first_chunk_latency=args.tts_first_chunk_latency,
+        tts_chunk_interval=args.tts_chunk_interval,
+        s3_latency=args.s3_latency,
+        s3_bandwidth=args.s3_bandwidth,
+        spotify_latency=args.spotify_latency,
+        trace_memory=not args.no_trace_memory,
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
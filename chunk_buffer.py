@@ -0,0 +1,116 @@
+"""
+Fan-out buffer for audio that is still being produced.
+
+A ChunkBuffer is filled by one producer (a synthesis response, a capture thread) and read
+by any number of consumers (the audio server, publish destinations, coalesced TTS callers),
+each from the start and as the chunks arrive.
+"""
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+
+class ChunkBuffer:
+    """
+    Thread-safe, append-only buffer of audio chunks with any number of live readers.
+
+    A producer thread appends chunks as they arrive from the synthesis generator while
+    readers iterate from the beginning and block until more data is available, so audio
+    can be played out while the rest is still being captured.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self._condition = threading.Condition()
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def append(self, chunk: bytes):
+        with self._condition:
+            if self.first_chunk_at is None:
+                self.first_chunk_at = time.perf_counter()
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+            self._condition.notify_all()
+
+    def close(self, error: Optional[BaseException] = None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self.finished_at = time.perf_counter()
+            self._condition.notify_all()
+
+    def feed(self, chunks: Iterable[bytes]):
+        """Consumes a chunk iterator into the buffer, recording any failure for readers."""
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.append(chunk)
+        except BaseException as e:
+            self.close(e)
+            raise
+        self.close()
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """Yields every chunk from the start, waiting for new ones until the buffer closes."""
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._chunks) and not self.done:
+                    self._condition.wait()
+                if index >= len(self._chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                pending = self._chunks[index:]
+            index += len(pending)
+            yield from pending
+
+    def wait(self, timeout: Optional[float] = None) -> bytes:
+        """Blocks until capture finishes and returns the complete audio."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.done, timeout=timeout):
+                raise TimeoutError("Audio capture did not finish in time")
+            if self.error is not None:
+                raise self.error
+        return self.getvalue()
+
+    def getvalue(self) -> bytes:
+        with self._condition:
+            return b"".join(self._chunks)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def time_to_first_chunk(self) -> Optional[float]:
+        if self.first_chunk_at is None:
+            return None
+        return self.first_chunk_at - self.started_at
+
+
+def start_capture(chunks: Iterable[bytes]) -> ChunkBuffer:
+    """
+    Starts consuming a lazy chunk iterator on a background thread.
+
+    Args:
+        chunks: The audio chunk iterator, e.g. from `client.text_to_speech.convert`.
+
+    Returns:
+        ChunkBuffer: The buffer being filled, readable while capture is in progress.
+    """
+    buffer = ChunkBuffer()
+
+    def run():
+        try:
+            buffer.feed(chunks)
+        except BaseException:
+            pass  # surfaced to readers through buffer.error
+
+    threading.Thread(target=run, name="audio-capture", daemon=True).start()
+    return buffer
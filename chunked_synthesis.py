@@ -0,0 +1,103 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List
+
+from dotenv import load_dotenv
+
+from mp3_index import audio_frames
+
+load_dotenv()
+
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "800"))
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "4"))
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Whitespace after a sentence's closing punctuation (and up to two closing quotes or
+# brackets, which stay with their sentence), or a paragraph break
+SENTENCE_BOUNDARY = re.compile(
+    r"(?:(?<=[.!?…])|(?<=[.!?…][\"')\]])|(?<=[.!?…][\"')\]]{2}))\s+|\n\s*\n"
+)
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits a block of text into sentences, keeping the closing punctuation, quotes and brackets.
+
+    >>> split_sentences('He said "Relax." Then (breathe.) Hold.')
+    ['He said "Relax."', 'Then (breathe.)', 'Hold.']
+    >>> split_sentences("Breathe in. (Hold it.) 'Now out!') Rest")
+    ['Breathe in.', '(Hold it.)', "'Now out!')", 'Rest']
+    """
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def split_text(text: str, max_chars: int = TTS_CHUNK_MAX_CHARS) -> List[str]:
+    """
+    Splits text into chunks at paragraph and sentence boundaries.
+
+    Sentences are packed greedily into chunks of at most `max_chars` characters, and a
+    new paragraph starts a new chunk whenever it would not fit in the current one. A
+    single sentence longer than `max_chars` is kept whole rather than cut mid-sentence.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): The soft upper bound on the length of each chunk.
+
+    Returns:
+        List[str]: The chunks, in reading order.
+    """
+    chunks = []
+    current = ""
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        separator = "\n\n"
+        for sentence in split_sentences(paragraph):
+            if current and len(current) + len(separator) + len(sentence) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}{separator}{sentence}" if current else sentence
+            separator = " "
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def synthesize_chunked(
+    chunks: Iterable[str],
+    synthesize: Callable[[str], Iterable[bytes]],
+    max_workers: int = TTS_MAX_WORKERS,
+) -> Iterator[bytes]:
+    """
+    Synthesizes text chunks concurrently and yields their audio in the original order.
+
+    Each chunk is rendered on a bounded thread pool, so total wall-clock time is driven
+    by the slowest chunks rather than the sum of all of them. The first chunk is passed
+    through lazily while the rest render in the background, and only the audio frames of
+    later segments are kept (no tags or headers), so the result is one continuous MP3 stream.
+
+    Args:
+        chunks: The text chunks, in reading order.
+        synthesize: Callable returning the audio chunks for one piece of text.
+        max_workers (int): The maximum number of concurrent synthesis requests.
+
+    Yields:
+        bytes: The stitched audio, in order.
+    """
+
+    def render(text: str) -> bytes:
+        return b"".join(chunk for chunk in synthesize(text) if chunk)
+
+    chunks = list(chunks)
+    if not chunks:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers - 1)) as executor:
+        futures = [executor.submit(render, chunk) for chunk in chunks[1:]]
+        try:
+            # The first chunk is relayed as it streams in, so playback can start right away
+            yield from synthesize(chunks[0])
+            for future in futures:
+                yield audio_frames(future.result())
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,173 @@
+"""
+Shared, lazily created API clients.
+
+The SDKs (elevenlabs, boto3, spotipy) are only imported when a client is first requested,
+and each client is created once per process and shared by every session and worker
+thread. Run `python clients.py` for a startup-time benchmark.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connections each client keeps open; sized for many concurrent sessions and workers
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "50"))
+ELEVENLABS_TIMEOUT = float(os.getenv("ELEVENLABS_TIMEOUT", "240"))
+
+_AWS_VARS = ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_REGION_NAME", "AWS_S3_BUCKET_NAME")
+_SPOTIFY_VARS = ("SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET", "SPOTIFY_SHOW_ID")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared(name: str, create):
+    """Returns the process-wide client called `name`, creating it on first use."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = create()
+    return client
+
+
+def _create_elevenlabs_client():
+    api_key = os.getenv("ELEVENLABS_API_KEY")
+    if not api_key:
+        raise ValueError("ELEVENLABS_API_KEY environment variable not set")
+
+    import httpx
+    from elevenlabs.client import ElevenLabs
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=CLIENT_POOL_SIZE,
+            max_keepalive_connections=CLIENT_POOL_SIZE,
+        ),
+        timeout=ELEVENLABS_TIMEOUT,
+    )
+    return ElevenLabs(api_key=api_key, httpx_client=http_client)
+
+
+def _create_s3_client():
+    if not s3_configured():
+        raise ValueError("AWS Environment variables not set properly")
+
+    import boto3
+    from botocore.config import Config
+
+    session = boto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_REGION_NAME"),
+    )
+    return session.client(
+        "s3",
+        endpoint_url=os.getenv("AWS_S3_ENDPOINT_URL") or None,
+        config=Config(
+            max_pool_connections=CLIENT_POOL_SIZE,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+        ),
+    )
+
+
+def get_elevenlabs_client():
+    """Returns the shared ElevenLabs client."""
+    return _shared("elevenlabs", _create_elevenlabs_client)
+
+
+def get_s3_client():
+    """Returns the shared boto3 S3 client."""
+    return _shared("s3", _create_s3_client)
+
+
+def s3_configured() -> bool:
+    """Tells whether the AWS environment variables needed for S3 are all set."""
+    return all(os.getenv(var) for var in _AWS_VARS)
+
+
+def set_client(name: str, client):
+    """
+    Replaces a shared client ("elevenlabs" or "s3"), e.g. with a local stand-in for
+    benchmarks. Passing None drops it so the next request creates a real one again.
+    """
+    with _clients_lock:
+        if client is None:
+            _clients.pop(name, None)
+        else:
+            _clients[name] = client
+
+
+def get_spotify_handler():
+    """Returns the shared SpotifyPodcastHandler."""
+    from spotify_handler import get_spotify_handler
+
+    return get_spotify_handler()
+
+
+def _time_in_fresh_interpreter(statement: str, runs: int) -> float:
+    """Median seconds a statement takes in a fresh interpreter, including its imports."""
+    script = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    # Placeholder credentials are enough: constructing clients does not hit the network
+    env = {
+        **os.environ,
+        **{
+            var: os.getenv(var) or "benchmark"
+            for var in ("ELEVENLABS_API_KEY", *_AWS_VARS, *_SPOTIFY_VARS)
+        },
+    }
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def benchmark_startup(runs: int = 5) -> dict:
+    """
+    Measures cold-start costs, each in a fresh interpreter.
+
+    Reports how long it takes to import every app module (which should no longer load
+    any SDK) and how long the first construction of each client takes.
+
+    Args:
+        runs (int): The number of fresh interpreters per measurement; the median is reported.
+
+    Returns:
+        dict: Median milliseconds per measurement.
+    """
+    statements = {
+        "import app modules": (
+            "import text_to_speech_stream, text_to_speech_file, s3_uploader, spotify_handler"
+        ),
+        "first ElevenLabs client": "import clients; clients.get_elevenlabs_client()",
+        "first S3 client": "import clients; clients.get_s3_client()",
+        "first Spotify handler": "import clients; clients.get_spotify_handler()",
+    }
+    return {
+        name: _time_in_fresh_interpreter(statement, runs) * 1000
+        for name, statement in statements.items()
+    }
+
+
+if __name__ == "__main__":
+    for name, millis in benchmark_startup().items():
+        print(f"{name:<26}{millis:8.1f} ms")
@@ -0,0 +1,232 @@
+"""
+Script enhancement that streams its output, and a pipeline that voices it while it is written.
+
+An enhancer turns a user's prompt into a rehearsal script and yields the script in pieces as
+it is produced (e.g. tokens from an LLM). `EnhancementPipeline` cuts those pieces into
+sentences as soon as they are complete and sends them to synthesis straight away, so the
+enhancer and text-to-speech run at the same time instead of one after the other.
+"""
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from chunked_synthesis import SENTENCE_BOUNDARY, TTS_MAX_WORKERS
+from mp3_index import audio_frames, build_index
+
+load_dotenv()
+
+ENHANCER = os.getenv("ENHANCER", "stub")
+ENHANCE_BATCH_MIN_CHARS = int(os.getenv("ENHANCE_BATCH_MIN_CHARS", "200"))
+
+
+class Enhancer(Protocol):
+    """Turns a prompt into a rehearsal script, yielding the script in pieces as it is written."""
+
+    def enhance(self, prompt: str) -> Iterator[str]:
+        ...
+
+
+class StubEnhancer:
+    """Placeholder enhancement: prefixes the prompt and yields it word by word."""
+
+    def enhance(self, prompt: str) -> Iterator[str]:
+        for match in re.finditer(r"\S+\s*", f"Enhanced: {prompt.strip()}"):
+            yield match.group()
+
+
+class FakeEnhancer:
+    """
+    Local stand-in for an LLM enhancer with realistic timing, for tests and benchmarks.
+
+    Args:
+        output (str): The script to produce; defaults to the stub enhancement of the prompt.
+        first_delay (float): Seconds before the first piece, like an LLM's time to first token.
+        piece_delay (float): Seconds between pieces.
+        words_per_piece (int): Words per yielded piece.
+    """
+
+    def __init__(self, output: str = None, first_delay: float = 0.5, piece_delay: float = 0.02,
+                 words_per_piece: int = 1):
+        self.output = output
+        self.first_delay = first_delay
+        self.piece_delay = piece_delay
+        self.words_per_piece = words_per_piece
+
+    def enhance(self, prompt: str) -> Iterator[str]:
+        words = re.findall(r"\S+\s*", self.output or f"Enhanced: {prompt.strip()}")
+        time.sleep(self.first_delay)
+        for start in range(0, len(words), self.words_per_piece):
+            if start:
+                time.sleep(self.piece_delay)
+            yield "".join(words[start:start + self.words_per_piece])
+
+
+def get_enhancer(name: str = ENHANCER) -> Enhancer:
+    """Returns the enhancer selected by the `ENHANCER` environment variable."""
+    if name == "fake":
+        return FakeEnhancer()
+    if name != "stub":
+        print(f"Unknown ENHANCER {name!r}; using the stub enhancer")
+    return StubEnhancer()
+
+
+def complete_sentences(pieces: Iterable[str]) -> Iterator[str]:
+    """
+    Regroups a stream of text pieces into sentences, yielding each one as soon as it is complete.
+
+    A sentence is complete when its closing punctuation (and any closing quotes or
+    brackets) is followed by whitespace, or at a paragraph break, exactly as
+    `split_sentences` splits; whatever is left when the stream ends is yielded last.
+    """
+    pending = ""
+    for piece in pieces:
+        pending += piece
+        *sentences, pending = SENTENCE_BOUNDARY.split(pending)
+        for sentence in sentences:
+            if sentence.strip():
+                yield sentence.strip()
+    if pending.strip():
+        yield pending.strip()
+
+
+def batch_sentences(sentences: Iterable[str], min_chars: int = ENHANCE_BATCH_MIN_CHARS) -> Iterator[str]:
+    """
+    Groups sentences into synthesis requests.
+
+    The first sentence goes out on its own so audio can start as early as possible; after
+    that sentences are grouped into requests of at least `min_chars` characters, which
+    keeps the number of requests (and prosody breaks between them) down.
+    """
+    batch = ""
+    first = True
+    for sentence in sentences:
+        batch = f"{batch} {sentence}" if batch else sentence
+        if first or len(batch) >= min_chars:
+            yield batch
+            batch = ""
+            first = False
+    if batch:
+        yield batch
+
+
+class EnhancementPipeline:
+    """
+    Voices a script while the enhancer is still writing it.
+
+    Iterating the pipeline yields one continuous MP3 stream. The enhancer runs on a
+    background thread; its first sentence is synthesized and relayed chunk by chunk as
+    soon as it is complete, and later sentence batches render on a bounded pool while
+    the enhancer keeps writing. `text` holds the script written so far, and `units` the
+    text and MP3 frame count of every batch voiced so far.
+
+    Args:
+        pieces: The enhancer output, e.g. `enhancer.enhance(prompt)`.
+        synthesize: Callable returning the audio chunks for one piece of text.
+        max_workers (int): The maximum number of concurrent synthesis requests.
+        min_chars (int): The minimum size of sentence batches after the first sentence.
+    """
+
+    def __init__(
+        self,
+        pieces: Iterable[str],
+        synthesize: Callable[[str], Iterable[bytes]],
+        max_workers: int = TTS_MAX_WORKERS,
+        min_chars: int = ENHANCE_BATCH_MIN_CHARS,
+    ):
+        self._pieces = pieces
+        self.synthesize = synthesize
+        self.max_workers = max_workers
+        self.min_chars = min_chars
+        self._written: List[str] = []
+        self._stopped = threading.Event()
+        self.done = False
+        self.units: List[Tuple[str, int]] = []  # (text, frame count) of each synthesized batch
+
+    @property
+    def text(self) -> str:
+        """The script written by the enhancer so far."""
+        return "".join(self._written)
+
+    def _record(self) -> Iterator[str]:
+        started_at = time.perf_counter()
+        for piece in self._pieces:
+            if self._stopped.is_set():
+                return
+            self._written.append(piece)
+            yield piece
+        metrics.observe("enhance_seconds", time.perf_counter() - started_at)
+        self.done = True
+
+    def _render(self, text: str) -> bytes:
+        return b"".join(chunk for chunk in self.synthesize(text) if chunk)
+
+    def _produce(self, executor: ThreadPoolExecutor, batches: "queue.Queue"):
+        try:
+            first = True
+            for batch in batch_sentences(complete_sentences(self._record()), self.min_chars):
+                if first:
+                    batches.put(("stream", batch))
+                    first = False
+                else:
+                    batches.put(("future", (batch, executor.submit(self._render, batch))))
+            batches.put(None)
+        except BaseException as e:
+            batches.put(("error", e))
+
+    def __iter__(self) -> Iterator[bytes]:
+        batches: "queue.Queue" = queue.Queue()
+        futures = []
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers - 1)) as executor:
+            threading.Thread(
+                target=self._produce, args=(executor, batches), name="enhancer", daemon=True
+            ).start()
+            try:
+                first = True
+                while True:
+                    item = batches.get()
+                    if item is None:
+                        return
+                    kind, value = item
+                    if kind == "error":
+                        raise value
+                    if kind == "stream":
+                        streamed = []
+                        for chunk in self.synthesize(value):
+                            streamed.append(chunk)
+                            yield chunk
+                        self.units.append((value, len(build_index(b"".join(streamed)))))
+                    else:
+                        batch, future = value
+                        futures.append(future)
+                        audio = future.result()
+                        self.units.append((batch, len(build_index(audio))))
+                        yield audio if first else audio_frames(audio)
+                    first = False
+            finally:
+                self._stopped.set()
+                for future in futures:
+                    future.cancel()
+                # Futures still queued are cancelled before the pool shuts down
+                while True:
+                    try:
+                        item = batches.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item and item[0] == "future":
+                        item[1][1].cancel()
+
+
+def enhance_and_synthesize(
+    prompt: str,
+    synthesize: Callable[[str], Iterable[bytes]],
+    enhancer: Optional[Enhancer] = None,
+) -> EnhancementPipeline:
+    """Starts enhancing a prompt and voicing the script as it is written."""
+    return EnhancementPipeline((enhancer or get_enhancer()).enhance(prompt), synthesize)
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))  # seconds finished jobs stay pollable
+
+QUEUED = "queued"
+ENHANCING = "enhancing"
+SYNTHESIZING = "synthesizing"
+SAVING = "saving"
+UPLOADING = "uploading"
+DONE = "done"
+FAILED = "failed"
+
+# A stage is a (state, callable) pair; the callable receives the job and may fill job.result.
+# A stage that does more than one thing may set job.state itself while it does each, so a
+# failure is reported against the step that actually failed
+Stage = Tuple[str, Callable[["Job"], None]]
+
+
+@dataclass
+class Job:
+    """
+    A unit of background work and everything a UI needs to poll its progress.
+    """
+
+    id: str
+    name: str
+    state: str = QUEUED
+    message: str = ""
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None  # the state the job was in when it failed
+    result: dict = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds spent per state
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.created_at
+
+
+class JobManager:
+    """
+    Runs jobs made of sequential stages on a bounded worker pool.
+
+    Submitting returns immediately, so a Streamlit script run never blocks on a slow
+    stage; callers poll `get` for the state, message and per-stage timings instead.
+    Finished jobs are dropped `retention` seconds after they finish, on access and by a
+    periodic sweep, so their results (which may hold audio) do not outlive them on an
+    idle server.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, retention: int = JOB_RETENTION):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._sweep, name="job-sweep", daemon=True).start()
+
+    def submit(self, name: str, stages: List[Stage]) -> Job:
+        """
+        Queues a job.
+
+        Args:
+            name (str): A short description of the job.
+            stages: The (state, callable) pairs to run in order.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job(id=uuid.uuid4().hex, name=name)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        queued_at = time.perf_counter()
+        self._executor.submit(self._run, job, stages, queued_at)
+        return job
+
+    def _run(self, job: Job, stages: List[Stage], queued_at: float):
+        job.timings[QUEUED] = time.perf_counter() - queued_at
+        try:
+            for state, run_stage in stages:
+                job.state = state
+                started_at = time.perf_counter()
+                try:
+                    run_stage(job)
+                finally:
+                    job.timings[state] = time.perf_counter() - started_at
+                    metrics.observe("job_stage_seconds", job.timings[state], stage=state)
+            job.state = DONE
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.failed_stage = job.state
+            job.state = FAILED
+        finally:
+            job.finished_at = time.time()
+            metrics.increment("jobs_total", state=job.state)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        """Stops the sweep and waits for running jobs to finish."""
+        self._stopped.set()
+        self._executor.shutdown(wait=True)
+
+    def _sweep(self):
+        while not self._stopped.wait(max(1, min(60, self.retention))):
+            with self._lock:
+                self._prune()
+
+    def _prune(self):
+        # Must be called with the lock held
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Returns the process-wide job manager, creating it on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
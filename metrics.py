@@ -0,0 +1,250 @@
+"""
+Lightweight timing and counting for the rehearsal pipeline.
+
+Code records measurements through `span`, `observe`, `increment` and `timed_chunks`; where
+they go is decided by one process-wide sink:
+
+- `PrometheusSink` aggregates them in process and renders the Prometheus text format
+  (served at `/metrics` by the local audio server).
+- `LogSink` writes one structured JSON log line per measurement.
+
+Set `METRICS_SINK` to `prometheus` or `log` to enable one. With no sink (the default) every
+call returns after a single `None` check, and `timed_chunks` hands back the iterator untouched.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_SINK = os.getenv("METRICS_SINK", "").lower()  # "", "prometheus" or "log"
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "rehearsals_")
+
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class PrometheusSink:
+    """
+    Aggregates counters and histograms in memory and renders them in the Prometheus
+    text exposition format. Histograms named `*_bytes` get byte-sized buckets, all
+    others get buckets in seconds.
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, list]] = {}  # -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float, labels: Labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels):
+        buckets = _BYTES_BUCKETS if name.endswith("_bytes") else _SECONDS_BUCKETS
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(labels)
+            if state is None:
+                state = series[labels] = [0] * (len(buckets) + 2)
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = f"{self.prefix}{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in series.items():
+                    lines.append(f"{metric}{self._format_labels(labels)} {value:.17g}")
+            for name, series in sorted(self._histograms.items()):
+                metric = f"{self.prefix}{name}"
+                buckets = _BYTES_BUCKETS if name.endswith("_bytes") else _SECONDS_BUCKETS
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, state in series.items():
+                    cumulative = 0
+                    for bound, count in zip(buckets, state):
+                        cumulative += count
+                        le = self._format_labels(labels, f'le="{bound:g}"')
+                        lines.append(f"{metric}_bucket{le} {cumulative}")
+                    le = self._format_labels(labels, 'le="+Inf"')
+                    lines.append(f"{metric}_bucket{le} {state[-2]}")
+                    lines.append(f"{metric}_count{self._format_labels(labels)} {state[-2]}")
+                    lines.append(f"{metric}_sum{self._format_labels(labels)} {state[-1]:.17g}")
+        return "\n".join(lines) + "\n"
+
+
+class LogSink:
+    """Writes every measurement as one JSON log line, for log-based aggregation."""
+
+    def __init__(self, logger: logging.Logger = None):
+        self.logger = logger or logging.getLogger("rehearsals.metrics")
+
+    def _log(self, kind: str, name: str, value: float, labels: Labels):
+        record = {"metric": name, "kind": kind, "value": value, "ts": time.time(), **dict(labels)}
+        self.logger.info(json.dumps(record))
+
+    def increment(self, name: str, value: float, labels: Labels):
+        self._log("counter", name, value, labels)
+
+    def observe(self, name: str, value: float, labels: Labels):
+        self._log("observation", name, value, labels)
+
+
+def _create_sink(kind: str):
+    if kind == "prometheus":
+        return PrometheusSink()
+    if kind == "log":
+        logging.basicConfig(level=logging.INFO)
+        return LogSink()
+    if kind:
+        print(f"Unknown METRICS_SINK {kind!r}; metrics are disabled")
+    return None
+
+
+_sink = _create_sink(METRICS_SINK)
+
+
+def set_sink(sink):
+    """Replaces the process-wide sink; None disables metrics."""
+    global _sink
+    _sink = sink
+
+
+def get_sink():
+    """Returns the process-wide sink, or None when metrics are disabled."""
+    return _sink
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels):
+    """Adds `value` to the counter `name`."""
+    if _sink is not None:
+        _sink.increment(name, value, _labels(labels))
+
+
+def observe(name: str, value: float, **labels):
+    """Records one observation (e.g. a duration or a size) of `name`."""
+    if _sink is not None:
+        _sink.observe(name, value, _labels(labels))
+
+
+class _Span:
+    __slots__ = ("name", "labels", "started_at")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.started_at = 0.0
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels.setdefault("outcome", "error")
+        observe(f"{self.name}_seconds", time.perf_counter() - self.started_at, **self.labels)
+        return False
+
+
+class _IgnoredLabels(dict):
+    def __setitem__(self, name, value):
+        pass
+
+    def setdefault(self, name, value=None):
+        return value
+
+
+class _NullSpan:
+    __slots__ = ()
+    labels = _IgnoredLabels()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **labels):
+    """
+    Times a block and records its duration as `<name>_seconds`.
+
+    Labels can still be added inside the block through `span.labels`; a block that raises
+    is labelled `outcome="error"`.
+
+    Example:
+        with metrics.span("s3_upload") as s:
+            ...
+            s.labels["skipped"] = True
+    """
+    if _sink is None:
+        return _NULL_SPAN
+    return _Span(name, labels)
+
+
+def timed_chunks(name: str, chunks: Iterable[bytes], **labels) -> Iterable[bytes]:
+    """
+    Wraps a chunk iterator to record its time to first chunk (`<name>_first_chunk_seconds`),
+    its total time (`<name>_seconds`), the size of every chunk (`<name>_chunk_bytes`) and
+    the bytes delivered (`<name>_bytes_total`).
+
+    Returns the iterator itself when metrics are disabled.
+    """
+    if _sink is None:
+        return chunks
+    return _timed_chunks(name, chunks, labels)
+
+
+def _timed_chunks(name: str, chunks: Iterable[bytes], labels: dict) -> Iterator[bytes]:
+    started_at = time.perf_counter()
+    first = True
+    total = 0
+    for chunk in chunks:
+        if first:
+            observe(f"{name}_first_chunk_seconds", time.perf_counter() - started_at, **labels)
+            first = False
+        observe(f"{name}_chunk_bytes", len(chunk), **labels)
+        total += len(chunk)
+        yield chunk
+    observe(f"{name}_seconds", time.perf_counter() - started_at, **labels)
+    increment(f"{name}_bytes_total", total, **labels)
+
+
+def render() -> Optional[str]:
+    """Returns the Prometheus text exposition, or None unless the sink is a PrometheusSink."""
+    sink = _sink
+    return sink.render() if isinstance(sink, PrometheusSink) else None
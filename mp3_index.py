@@ -0,0 +1,216 @@
+"""
+Minimal MPEG audio (Layer III) frame parser and index.
+
+ElevenLabs' `mp3_22050_32` output is MPEG-2 Layer III at 22050 Hz and 32 kbps: constant-size
+frames of 576 samples (~26 ms). Walking the frame headers is enough to get the exact
+duration, map timestamps to byte offsets and concatenate streams on frame boundaries,
+without decoding or re-encoding anything.
+"""
+import struct
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from typing import Iterable, Optional
+
+# Bitrates in kbps for Layer III, by bitrate index
+_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),  # MPEG-1
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),  # MPEG-2 and 2.5
+}
+_SAMPLE_RATES = {
+    0b11: (44100, 48000, 32000),  # MPEG-1
+    0b10: (22050, 24000, 16000),  # MPEG-2
+    0b00: (11025, 12000, 8000),  # MPEG-2.5
+}
+
+FrameHeader = namedtuple(
+    "FrameHeader", "mpeg1 bitrate sample_rate padding channels length samples crc"
+)
+
+_INDEX_MAGIC = b"MP3I"
+_INDEX_HEADER = struct.Struct("<4sBIIQ")  # magic, version, sample rate, frame count, end offset
+
+
+def parse_frame_header(data, pos: int = 0) -> Optional[FrameHeader]:
+    """
+    Parses the 4-byte MPEG Layer III frame header at `pos`.
+
+    Returns:
+        FrameHeader: The decoded header, or None if there is no valid Layer III header there.
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = (b1 >> 3) & 0b11
+    layer = (b1 >> 1) & 0b11
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0b11
+    if version == 0b01 or layer != 0b01 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None  # reserved values, other layers or free-format streams
+
+    mpeg1 = version == 0b11
+    bitrate = _BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 1
+    samples = 1152 if mpeg1 else 576
+    length = (samples // 8) * bitrate // sample_rate + padding
+    return FrameHeader(
+        mpeg1=mpeg1,
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        padding=padding,
+        channels=1 if b3 >> 6 == 0b11 else 2,
+        length=length,
+        samples=samples,
+        crc=not (b1 & 1),
+    )
+
+
+def id3v2_size(data) -> int:
+    """Returns the size of a leading ID3v2 tag (0 if there is none)."""
+    if len(data) >= 10 and bytes(data[:3]) == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def _is_info_frame(data, pos: int, header: FrameHeader) -> bool:
+    """Detects a Xing/Info/VBRI metadata frame, which carries no audio of its own."""
+    side_info = (17 if header.channels == 1 else 32) if header.mpeg1 else (9 if header.channels == 1 else 17)
+    tag_pos = pos + 4 + (2 if header.crc else 0) + side_info
+    return bytes(data[tag_pos:tag_pos + 4]) in (b"Xing", b"Info") or bytes(data[pos + 36:pos + 40]) == b"VBRI"
+
+
+class Mp3Index:
+    """
+    Byte offsets and start times of every audio frame in an MP3 stream.
+
+    Lookups in either direction are a binary search over the frame tables.
+    """
+
+    def __init__(self, offsets: array, starts: array, sample_rate: int, end: int):
+        self.offsets = offsets  # byte offset of each frame
+        self.starts = starts  # start sample of each frame, plus the total as a final entry
+        self.sample_rate = sample_rate
+        self.end = end  # byte offset just past the last frame
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def start(self) -> int:
+        """Byte offset of the first audio frame."""
+        return self.offsets[0] if self.offsets else self.end
+
+    @property
+    def duration(self) -> float:
+        """Duration of the audio in seconds."""
+        return self.starts[-1] / self.sample_rate if self.sample_rate else 0.0
+
+    def frame_at(self, seconds: float) -> int:
+        """Returns the number of the frame playing at `seconds`."""
+        if not self.offsets:
+            return 0
+        sample = max(0, int(seconds * self.sample_rate))
+        return min(bisect_right(self.starts, sample) - 1, len(self.offsets) - 1)
+
+    def byte_offset(self, seconds: float) -> int:
+        """Returns the offset of the frame playing at `seconds`, where playback can resume."""
+        return self.offsets[self.frame_at(seconds)] if self.offsets else self.end
+
+    def time_at(self, byte_offset: int) -> float:
+        """Returns the start time of the frame containing `byte_offset`."""
+        if not self.offsets:
+            return 0.0
+        frame = max(0, bisect_right(self.offsets, byte_offset) - 1)
+        return self.starts[frame] / self.sample_rate
+
+    def to_bytes(self) -> bytes:
+        """Serializes the index so it can be stored next to the audio."""
+        header = _INDEX_HEADER.pack(_INDEX_MAGIC, 1, self.sample_rate, len(self.offsets), self.end)
+        return header + array("Q", self.offsets).tobytes() + array("Q", self.starts).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Mp3Index":
+        magic, version, sample_rate, count, end = _INDEX_HEADER.unpack_from(data)
+        if magic != _INDEX_MAGIC or version != 1:
+            raise ValueError("Not an MP3 index")
+        offsets = array("Q")
+        offsets.frombytes(data[_INDEX_HEADER.size:_INDEX_HEADER.size + 8 * count])
+        starts = array("Q")
+        starts.frombytes(data[_INDEX_HEADER.size + 8 * count:_INDEX_HEADER.size + 16 * (count + 1)])
+        return cls(offsets, starts, sample_rate, end)
+
+
+def build_index(data) -> Mp3Index:
+    """
+    Scans an MP3 stream and indexes its audio frames.
+
+    Leading ID3v2 tags, Xing/Info frames and a trailing ID3v1 tag are skipped, and the
+    scanner resynchronises on the next frame header after any garbage.
+
+    Args:
+        data: The MP3 bytes (bytes, bytearray, memoryview or mmap).
+
+    Returns:
+        Mp3Index: The frame index.
+    """
+    offsets = array("Q")
+    starts = array("Q")
+    sample_rate = 0
+    total = 0
+    pos = id3v2_size(data)
+    end = pos
+    size = len(data)
+
+    while pos + 4 <= size:
+        header = parse_frame_header(data, pos)
+        if header is None or pos + header.length > size:
+            if bytes(data[pos:pos + 3]) == b"TAG" and size - pos == 128:
+                break  # ID3v1 tag
+            pos += 1
+            continue
+        if not offsets and _is_info_frame(data, pos, header):
+            pos += header.length
+            end = pos
+            continue
+        sample_rate = sample_rate or header.sample_rate
+        offsets.append(pos)
+        starts.append(total)
+        total += header.samples
+        pos += header.length
+        end = pos
+
+    starts.append(total)
+    return Mp3Index(offsets, starts, sample_rate, end)
+
+
+def audio_frames(data, index: Mp3Index = None) -> memoryview:
+    """Returns a zero-copy view of just the audio frames of an MP3 stream."""
+    index = index or build_index(data)
+    return memoryview(data)[index.start:index.end]
+
+
+def concat_mp3(streams: Iterable) -> bytes:
+    """
+    Concatenates MP3 streams on frame boundaries, without decoding.
+
+    Only the audio frames of each stream are kept, so tags and Xing/Info headers, whose
+    frame counts would be wrong for the combined stream, are dropped.
+
+    Raises:
+        ValueError: If the streams have different sample rates.
+    """
+    parts = []
+    sample_rate = None
+    for data in streams:
+        index = build_index(data)
+        if not len(index):
+            continue
+        if sample_rate and index.sample_rate != sample_rate:
+            raise ValueError(
+                f"Cannot concatenate {index.sample_rate} Hz audio onto {sample_rate} Hz audio"
+            )
+        sample_rate = index.sample_rate
+        parts.append(audio_frames(data, index))
+    return b"".join(parts)
@@ -0,0 +1,185 @@
+"""
+Playlist support: prefetching neighbouring rehearsals and gapless back-to-back playback.
+
+`PlaylistCache` keeps the audio and MP3 frame index of the rehearsals around the one being
+played, loading them on a small background pool before they are needed and dropping the
+ones far from the current position, so stepping through a library of any size stays
+instant while memory stays bounded. `session_chunks` plays several rehearsals as one
+continuous MP3 stream, joined on frame boundaries without re-encoding.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from dotenv import load_dotenv
+
+import metrics
+from mp3_index import Mp3Index, audio_frames
+
+load_dotenv()
+
+PLAYLIST_CACHE_ITEMS = int(os.getenv("PLAYLIST_CACHE_ITEMS", "8"))
+PLAYLIST_PREFETCH_RADIUS = int(os.getenv("PLAYLIST_PREFETCH_RADIUS", "2"))
+PLAYLIST_PREFETCH_WORKERS = int(os.getenv("PLAYLIST_PREFETCH_WORKERS", "2"))
+
+
+class PlaylistItem(NamedTuple):
+    audio: bytes
+    index: Mp3Index
+
+
+def _load_from_store(rehearsal_id: str) -> Optional[PlaylistItem]:
+    from rehearsal_store import get_rehearsal_store
+
+    store = get_rehearsal_store()
+    audio = store.load_audio(rehearsal_id)
+    if audio is None:
+        return None
+    return PlaylistItem(audio, store.load_index(rehearsal_id))
+
+
+def neighbours(ids: Sequence[str], position: int, radius: int) -> List[str]:
+    """Returns the ids within `radius` of `position`, nearest first, wrapping around the ends."""
+    if not ids:
+        return []
+    found = [ids[position % len(ids)]]
+    for distance in range(1, radius + 1):
+        for step in (distance, -distance):
+            rehearsal_id = ids[(position + step) % len(ids)]
+            if rehearsal_id not in found:
+                found.append(rehearsal_id)
+    return found
+
+
+class PlaylistCache:
+    """
+    Bounded cache of loaded rehearsals with background prefetching.
+
+    Loads are single-flight: a rehearsal requested while its prefetch is running waits
+    for that load instead of starting another one. Each listener gets their own cache,
+    since eviction follows their position in the playlist.
+
+    Args:
+        load: Callable returning the PlaylistItem for a rehearsal ID (None if it has no audio).
+        capacity (int): The maximum number of loaded rehearsals kept in memory.
+        radius (int): How many rehearsals on each side of the current one are prefetched.
+        workers (int): The number of background loader threads.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[str], Optional[PlaylistItem]] = _load_from_store,
+        capacity: int = PLAYLIST_CACHE_ITEMS,
+        radius: int = PLAYLIST_PREFETCH_RADIUS,
+        workers: int = PLAYLIST_PREFETCH_WORKERS,
+    ):
+        self.load = load
+        self.radius = radius
+        self.capacity = max(capacity, 2 * radius + 1)
+        self._items: "OrderedDict[str, PlaylistItem]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        # Reentrant: a load that is already done runs its callback while the lock is held
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+
+    def _loaded(self, rehearsal_id: str, future: Future):
+        with self._lock:
+            self._loading.pop(rehearsal_id, None)
+            if future.cancelled() or future.exception() is not None or future.result() is None:
+                return
+            self._items[rehearsal_id] = future.result()
+            self._items.move_to_end(rehearsal_id)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def _start_load(self, rehearsal_id: str) -> Future:
+        # Must be called with the lock held
+        future = self._loading.get(rehearsal_id)
+        if future is None:
+            future = self._executor.submit(self.load, rehearsal_id)
+            self._loading[rehearsal_id] = future
+            future.add_done_callback(lambda done: self._loaded(rehearsal_id, done))
+        return future
+
+    def get(self, rehearsal_id: str) -> Optional[PlaylistItem]:
+        """Returns a loaded rehearsal, waiting for it if it is not in the cache yet."""
+        with self._lock:
+            item = self._items.get(rehearsal_id)
+            if item is not None:
+                self._items.move_to_end(rehearsal_id)
+                metrics.increment("playlist_cache_total", result="hit")
+                return item
+            future = self._start_load(rehearsal_id)
+        metrics.increment("playlist_cache_total", result="miss")
+        try:
+            return future.result()
+        except CancelledError:
+            # Its prefetch was dropped by a focus change in the meantime
+            return self.load(rehearsal_id)
+
+    def prefetch(self, rehearsal_ids: Sequence[str]):
+        """Starts loading rehearsals in the background; returns immediately."""
+        with self._lock:
+            for rehearsal_id in rehearsal_ids:
+                if rehearsal_id not in self._items:
+                    self._start_load(rehearsal_id)
+
+    def focus(self, ids: Sequence[str], position: int, prefetch: bool = True):
+        """
+        Moves the playlist to `position`: prefetches its neighbours and evicts rehearsals
+        outside the prefetch radius, so memory follows the listener through the library.
+
+        Pass `prefetch=False` when the player fetches the audio itself (e.g. from URLs), so
+        only the eviction happens.
+        """
+        wanted = neighbours(ids, position, self.radius)
+        with self._lock:
+            keep = set(wanted)
+            for rehearsal_id in list(self._items):
+                if rehearsal_id not in keep:
+                    del self._items[rehearsal_id]
+            for rehearsal_id, future in list(self._loading.items()):
+                if rehearsal_id not in keep:
+                    future.cancel()
+        if prefetch:
+            self.prefetch(wanted)
+
+    def __contains__(self, rehearsal_id: str) -> bool:
+        with self._lock:
+            return rehearsal_id in self._items
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+def session_chunks(rehearsal_ids: Sequence[str], cache: PlaylistCache) -> Iterator[bytes]:
+    """
+    Plays rehearsals back to back as one continuous MP3 stream.
+
+    Each rehearsal contributes only its audio frames (no tags or Xing headers), so the
+    joins are gapless, and the next rehearsal is prefetched while the current one streams.
+
+    Raises:
+        ValueError: If the rehearsals have different sample rates.
+    """
+    sample_rate = None
+    for number, rehearsal_id in enumerate(rehearsal_ids):
+        cache.prefetch(rehearsal_ids[number + 1:number + 2])
+        item = cache.get(rehearsal_id)
+        if item is None or not len(item.index):
+            continue
+        if sample_rate and item.index.sample_rate != sample_rate:
+            raise ValueError(
+                f"Cannot play {item.index.sample_rate} Hz audio after {sample_rate} Hz audio"
+            )
+        sample_rate = item.index.sample_rate
+        yield audio_frames(item.audio, item.index)
+
+
+def render_session(rehearsal_ids: Sequence[str], cache: PlaylistCache) -> bytes:
+    """Renders rehearsals back to back into a single gapless MP3."""
+    return b"".join(session_chunks(rehearsal_ids, cache))
+
@@ -0,0 +1,111 @@
+"""
+Publishes rehearsal audio to every destination at once.
+
+Each destination is a callable that receives the same audio and creates its own reader
+over it (a BytesIO for S3, memoryview slices for the Spotify multipart body), so nothing
+is copied per destination. The audio may also be a ChunkBuffer that is still being
+captured: S3 then streams it as it arrives, so the upload overlaps synthesis. Uploads run
+concurrently and results are reported per destination as they finish, so a slow or
+failing destination neither delays nor fails the others and the total time is close to
+that of the slowest upload.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+import metrics
+from chunk_buffer import ChunkBuffer
+
+Audio = Union[bytes, ChunkBuffer]
+Destination = Callable[[Audio], Any]
+
+
+@dataclass
+class PublishResult:
+    """The outcome of publishing to one destination."""
+
+    destination: str
+    ok: bool
+    value: Any = None  # e.g. the S3 key or the Spotify episode ID
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+def s3_destination(rehearsal_id: str) -> Destination:
+    """
+    Uploads to S3 under a content-addressed key; the result value is the key.
+
+    Audio that is still being captured is streamed to S3 as it arrives.
+    """
+
+    def upload(audio: Audio) -> str:
+        from s3_uploader import upload_audiostream_to_s3, upload_stream_to_s3
+
+        if isinstance(audio, ChunkBuffer):
+            return upload_stream_to_s3(audio.iter_chunks(), rehearsal_id)
+        # BytesIO over an immutable bytes object shares its buffer instead of copying it
+        return upload_audiostream_to_s3(BytesIO(audio), rehearsal_id)
+
+    return upload
+
+
+def spotify_destination(spotify_handler, title: str, description: str) -> Destination:
+    """Uploads a Spotify episode; the result value is the episode ID."""
+
+    def upload(audio: Audio) -> str:
+        audio_data = audio.wait() if isinstance(audio, ChunkBuffer) else audio
+        episode_id = spotify_handler.upload_episode(
+            audio_data=memoryview(audio_data),
+            title=title,
+            description=description,
+        )
+        if not episode_id:
+            raise RuntimeError("Upload to Spotify failed")
+        return episode_id
+
+    return upload
+
+
+def _run(name: str, destination: Destination, audio: Audio) -> PublishResult:
+    started_at = time.perf_counter()
+    with metrics.span("publish", destination=name) as span:
+        try:
+            value = destination(audio)
+        except Exception as e:
+            print(f"Publishing to {name} failed: {str(e)}")
+            span.labels["outcome"] = "error"
+            return PublishResult(name, False, error=str(e), seconds=time.perf_counter() - started_at)
+    return PublishResult(name, True, value=value, seconds=time.perf_counter() - started_at)
+
+
+def publish(audio: Audio, destinations: Dict[str, Destination]) -> Iterator[PublishResult]:
+    """
+    Uploads audio to several destinations concurrently.
+
+    The uploads start when this is called, not when the results are first read, so the
+    caller can do other work (e.g. wait for the capture and store it) while they run.
+
+    Args:
+        audio: The finished audio, shared read-only by every destination, or a
+            ChunkBuffer that may still be capturing it.
+        destinations: Callables keyed by destination name, e.g. from `s3_destination`
+            and `spotify_destination`.
+
+    Returns:
+        Iterator[PublishResult]: The result of each destination, in completion order.
+            Failures are reported as results rather than raised.
+    """
+    if not destinations:
+        return iter(())
+    if not isinstance(audio, ChunkBuffer):
+        audio = bytes(audio)  # no-op for bytes; guarantees an immutable buffer
+    executor = ThreadPoolExecutor(max_workers=len(destinations), thread_name_prefix="publish")
+    futures = [
+        executor.submit(_run, name, destination, audio)
+        for name, destination in destinations.items()
+    ]
+    # Submitted uploads keep running; this only releases the threads once they finish
+    executor.shutdown(wait=False)
+    return (future.result() for future in as_completed(futures))
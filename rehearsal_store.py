@@ -0,0 +1,277 @@
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from mp3_index import Mp3Index, build_index
+
+load_dotenv()
+
+REHEARSALS_DATA_DIR = os.getenv("REHEARSALS_DATA_DIR", "data")
+
+_COLUMNS = (
+    "id",
+    "title",
+    "content",
+    "created_at",
+    "audio_size",
+    "spotify_episode_id",
+    "spotify_url",
+    "owner",
+    "units",
+)
+
+# Columns holding JSON values
+_JSON_COLUMNS = ("units",)
+
+# Bulky fields left out of `list()` and `summary()`; `get()` returns them
+_UNLISTED = ("content", "units")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rehearsals (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    audio_size INTEGER NOT NULL DEFAULT 0,
+    spotify_episode_id TEXT,
+    spotify_url TEXT,
+    owner TEXT,
+    units TEXT,
+    extra TEXT NOT NULL DEFAULT '{}'
+)
+"""
+
+_OWNER_INDEX = "CREATE INDEX IF NOT EXISTS rehearsals_owner ON rehearsals (owner, created_at)"
+
+
+class RehearsalStore:
+    """
+    Persistent rehearsal library: metadata in SQLite, audio as one file per rehearsal.
+
+    Listing rehearsals only touches the metadata table and leaves out transcripts and
+    other bulky fields, so callers can keep a library in memory as lightweight dicts and
+    load the rest on demand with `get` and `load_audio`. Each rehearsal can belong to an
+    `owner` (e.g. one app session's library), which `list` filters on. A rehearsal's
+    `units` (its sentences mapped to audio, i.e. the transcript again) get a column of
+    their own for the same reason. Other fields that are not core columns are kept in a
+    JSON `extra` column and merged back into the returned dicts.
+    """
+
+    def __init__(self, directory: str = REHEARSALS_DATA_DIR):
+        self.directory = directory
+        self.audio_dir = os.path.join(directory, "audio")
+        self.db_path = os.path.join(directory, "rehearsals.db")
+        os.makedirs(self.audio_dir, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            # Libraries created before rehearsals had owners
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(rehearsals)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE rehearsals ADD COLUMN owner TEXT")
+            if "units" not in columns:
+                # Units used to live in `extra`, which every listing reads
+                conn.execute("ALTER TABLE rehearsals ADD COLUMN units TEXT")
+                for row in conn.execute("SELECT id, extra FROM rehearsals").fetchall():
+                    extra = json.loads(row["extra"])
+                    if "units" in extra:
+                        conn.execute(
+                            "UPDATE rehearsals SET units = ?, extra = ? WHERE id = ?",
+                            (json.dumps(extra.pop("units")), json.dumps(extra), row["id"]),
+                        )
+            conn.execute(_OWNER_INDEX)
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        rehearsal = json.loads(row["extra"])
+        for column in _COLUMNS:
+            if column not in row.keys():
+                continue
+            value = row[column]
+            if column in _JSON_COLUMNS:
+                if value is None:
+                    continue
+                value = json.loads(value)
+            rehearsal[column] = value
+        return rehearsal
+
+    @staticmethod
+    def summary(rehearsal: dict) -> dict:
+        """Returns the lightweight metadata of a rehearsal, as `list` does."""
+        return {name: value for name, value in rehearsal.items() if name not in _UNLISTED}
+
+    @staticmethod
+    def _split_fields(fields: dict):
+        core = {
+            name: json.dumps(value) if name in _JSON_COLUMNS and value is not None else value
+            for name, value in fields.items()
+            if name in _COLUMNS
+        }
+        extra = {name: value for name, value in fields.items() if name not in _COLUMNS}
+        return core, extra
+
+    def audio_path(self, rehearsal_id: str) -> str:
+        """Returns the path of the audio file for a rehearsal."""
+        return os.path.join(self.audio_dir, f"{rehearsal_id}.mp3")
+
+    def index_path(self, rehearsal_id: str) -> str:
+        """Returns the path of the MP3 frame index stored next to a rehearsal's audio."""
+        return os.path.join(self.audio_dir, f"{rehearsal_id}.idx")
+
+    def _write_file(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.audio_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def add(self, rehearsal: dict, audio_data: bytes, index: Optional[Mp3Index] = None) -> dict:
+        """
+        Saves a new rehearsal, its audio and the audio's MP3 frame index.
+
+        The files are written to temporary files and moved into place before the metadata
+        row is inserted, so a listed rehearsal always has complete audio.
+
+        Args:
+            rehearsal: The rehearsal metadata; must contain id, title, content and created_at.
+            audio_data: The MP3 audio for the rehearsal.
+            index: The audio's frame index if it is already known (e.g. from an archive);
+                built from the audio otherwise.
+
+        Returns:
+            dict: The stored metadata, without the audio.
+        """
+        rehearsal = {
+            name: value for name, value in rehearsal.items() if name != "audio_data"
+        }
+        if index is None:
+            index = build_index(audio_data)
+        rehearsal["audio_size"] = len(audio_data)
+        rehearsal["duration"] = round(index.duration, 3)
+
+        self._write_file(self.audio_path(rehearsal["id"]), audio_data)
+        self._write_file(self.index_path(rehearsal["id"]), index.to_bytes())
+
+        core, extra = self._split_fields(rehearsal)
+        columns = list(core) + ["extra"]
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO rehearsals ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                [*core.values(), json.dumps(extra)],
+            )
+        return rehearsal
+
+    def update(self, rehearsal_id: str, **fields) -> Optional[dict]:
+        """Updates metadata fields of an existing rehearsal and returns the new metadata."""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM rehearsals WHERE id = ?", (rehearsal_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rehearsal = self._to_dict(row)
+            rehearsal.update(fields)
+            core, extra = self._split_fields(rehearsal)
+            assignments = ", ".join(f"{name} = ?" for name in core)
+            conn.execute(
+                f"UPDATE rehearsals SET {assignments}, extra = ? WHERE id = ?",
+                [*core.values(), json.dumps(extra), rehearsal_id],
+            )
+        return rehearsal
+
+    def get(self, rehearsal_id: str) -> Optional[dict]:
+        """Returns the metadata of one rehearsal, or None if it does not exist."""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM rehearsals WHERE id = ?", (rehearsal_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, owner: Optional[str] = None) -> List[dict]:
+        """
+        Returns the lightweight metadata of rehearsals, oldest first, without transcripts.
+
+        Args:
+            owner (str): Only list this owner's rehearsals; all rehearsals if None.
+        """
+        columns = ", ".join(column for column in _COLUMNS if column not in _UNLISTED)
+        query = f"SELECT {columns}, extra FROM rehearsals"
+        with self._connection() as conn:
+            if owner is None:
+                rows = conn.execute(f"{query} ORDER BY created_at").fetchall()
+            else:
+                rows = conn.execute(f"{query} WHERE owner = ? ORDER BY created_at", (owner,)).fetchall()
+        return [self.summary(self._to_dict(row)) for row in rows]
+
+    def load_audio(self, rehearsal_id: str) -> Optional[bytes]:
+        """Reads the audio of a rehearsal from disk, or returns None if there is none."""
+        try:
+            with open(self.audio_path(rehearsal_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def load_index(self, rehearsal_id: str) -> Optional[Mp3Index]:
+        """
+        Returns the MP3 frame index of a rehearsal's audio, or None if there is no audio.
+
+        Rehearsals stored before indexes existed get theirs built and saved on first use.
+        """
+        try:
+            with open(self.index_path(rehearsal_id), "rb") as f:
+                return Mp3Index.from_bytes(f.read())
+        except (FileNotFoundError, ValueError, struct.error):
+            pass
+        audio_data = self.load_audio(rehearsal_id)
+        if audio_data is None:
+            return None
+        index = build_index(audio_data)
+        self._write_file(self.index_path(rehearsal_id), index.to_bytes())
+        return index
+
+    def delete(self, rehearsal_id: str):
+        """Removes a rehearsal, its audio and its index."""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM rehearsals WHERE id = ?", (rehearsal_id,))
+        for path in (self.audio_path(rehearsal_id), self.index_path(rehearsal_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_rehearsal_store() -> RehearsalStore:
+    """Returns the process-wide rehearsal store, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RehearsalStore()
+    return _store
@@ -0,0 +1,171 @@
+"""
+Incremental re-synthesis of edited rehearsal scripts.
+
+A stored rehearsal remembers which text each stretch of its audio speaks, as "units" of
+one or more sentences with the byte range of their MP3 frames. When the script is edited,
+the new sentences are diffed against the old ones; units whose sentences are all unchanged
+keep their audio, and only the changed or inserted text is synthesized and stitched back
+in on frame boundaries. Regenerating after an edit costs roughly the size of the edit
+rather than the length of the script.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from chunked_synthesis import TTS_MAX_WORKERS, split_sentences, split_text
+from mp3_index import Mp3Index, audio_frames
+
+load_dotenv()
+
+# Changed text is synthesized in units of at most this many characters, which bounds
+# how much has to be re-rendered when one sentence in a unit changes later
+RESYNTH_UNIT_MAX_CHARS = int(os.getenv("RESYNTH_UNIT_MAX_CHARS", "300"))
+
+# A unit is [text, first byte, end byte] of its frames in the rehearsal's audio
+Unit = List
+
+
+def _sentences(text: str) -> List[str]:
+    # Whitespace is normalized so re-wrapped or re-joined text still matches
+    return [" ".join(sentence.split()) for sentence in split_sentences(text)]
+
+
+def units_from_frames(parts: Iterable[Tuple[str, int]], index: Mp3Index) -> List[Unit]:
+    """
+    Turns the (text, frame count) of each consecutively synthesized part into byte ranges
+    of the assembled audio.
+
+    Returns an empty list when the frame counts do not add up to the audio, so a
+    mismatch only costs a full re-render later instead of splicing the wrong audio.
+    """
+    units = []
+    frame = 0
+    for text, frames in parts:
+        if frames <= 0:
+            continue
+        if frame + frames > len(index):
+            return []
+        end = index.offsets[frame + frames] if frame + frames < len(index) else index.end
+        units.append([text, index.offsets[frame], end])
+        frame += frames
+    return units if frame == len(index) else []
+
+
+def plan(old_units: Sequence[Unit], sentences: Sequence[str]) -> List[Tuple[str, object]]:
+    """
+    Decides which old units can be reused for a new list of sentences.
+
+    Sentences are matched with difflib. An old unit is reused only if every one of its
+    sentences is unchanged and still in the same order; all other new sentences are
+    grouped into runs to synthesize.
+
+    Returns:
+        List[Tuple[str, object]]: ("reuse", unit) and ("synthesize", text) steps, in order.
+    """
+    old_sentences = []  # (sentence, unit number, position in unit)
+    for number, unit in enumerate(old_units):
+        for position, sentence in enumerate(_sentences(unit[0])):
+            old_sentences.append((sentence, number, position))
+
+    new_sentences = [" ".join(sentence.split()) for sentence in sentences]
+    matcher = SequenceMatcher(None, [s for s, _, _ in old_sentences], new_sentences, autojunk=False)
+    new_to_old = {}
+    for tag, old_first, old_last, new_first, new_last in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(old_last - old_first):
+                new_to_old[new_first + offset] = old_first + offset
+
+    steps = []
+    pending = []
+    i = 0
+    while i < len(sentences):
+        j = new_to_old.get(i)
+        if j is not None and old_sentences[j][2] == 0:
+            number = old_sentences[j][1]
+            length = len(_sentences(old_units[number][0]))
+            if all(new_to_old.get(i + k) == j + k for k in range(length)):
+                if pending:
+                    steps.append(("synthesize", " ".join(pending)))
+                    pending = []
+                steps.append(("reuse", old_units[number]))
+                i += length
+                continue
+        pending.append(sentences[i])
+        i += 1
+    if pending:
+        steps.append(("synthesize", " ".join(pending)))
+    return steps
+
+
+def resynthesize(
+    text: str,
+    synthesize: Callable[[str], Iterable[bytes]],
+    old_audio=None,
+    old_units: Optional[Sequence[Unit]] = None,
+    max_workers: int = TTS_MAX_WORKERS,
+    unit_max_chars: int = RESYNTH_UNIT_MAX_CHARS,
+) -> Tuple[bytes, List[Unit]]:
+    """
+    Synthesizes a script, reusing the audio of unchanged units of a previous version.
+
+    Changed text is split into units of at most `unit_max_chars` characters, which are
+    synthesized concurrently. Without a previous version everything is synthesized.
+
+    Args:
+        text (str): The new script.
+        synthesize: Callable returning the audio chunks for one piece of text.
+        old_audio: The previous version's audio (bytes, memoryview or mmap).
+        old_units: The previous version's units.
+        max_workers (int): The maximum number of concurrent synthesis requests.
+        unit_max_chars (int): The maximum size of newly synthesized units.
+
+    Returns:
+        Tuple[bytes, List[Unit]]: The new audio (MP3 frames only) and its units.
+    """
+    sentences = split_sentences(text)
+    steps = plan(old_units or [], sentences) if old_audio is not None else [("synthesize", text)]
+
+    pieces = []  # ("reuse", unit) or ("render", text)
+    for kind, value in steps:
+        if kind == "reuse":
+            pieces.append((kind, value))
+        else:
+            pieces.extend(("render", piece) for piece in split_text(value, unit_max_chars))
+
+    reused = sum(len(value[0]) for kind, value in pieces if kind == "reuse")
+    rendered = sum(len(value) for kind, value in pieces if kind == "render")
+    metrics.increment("resynth_characters_total", reused, result="reused")
+    metrics.increment("resynth_characters_total", rendered, result="synthesized")
+
+    def render(piece: str) -> bytes:
+        return b"".join(chunk for chunk in synthesize(piece) if chunk)
+
+    source = memoryview(old_audio) if old_audio is not None else None
+    parts = []
+    units = []
+    size = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            number: executor.submit(render, value)
+            for number, (kind, value) in enumerate(pieces)
+            if kind == "render"
+        }
+        try:
+            for number, (kind, value) in enumerate(pieces):
+                if kind == "reuse":
+                    unit_text, start, end = value
+                    frames = source[start:end]
+                else:
+                    unit_text = value
+                    frames = audio_frames(futures[number].result())
+                parts.append(frames)
+                units.append([unit_text, size, size + len(frames)])
+                size += len(frames)
+        finally:
+            for future in futures.values():
+                future.cancel()
+    return b"".join(parts), units
@@ -1,65 +1,425 @@
+import hashlib
+import itertools
 import os
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, List, Tuple
 
-import boto3
 from dotenv import load_dotenv
 
+import metrics
+from clients import get_s3_client
+
 load_dotenv()
 
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION_NAME = os.getenv("AWS_REGION_NAME")
+# Credentials, region and endpoint are read by the shared client factory in clients.py
 AWS_S3_BUCKET_NAME = os.getenv("AWS_S3_BUCKET_NAME")
 
-if (
-    not AWS_ACCESS_KEY_ID
-    or not AWS_SECRET_ACCESS_KEY
-    or not AWS_REGION_NAME
-    or not AWS_S3_BUCKET_NAME
-):
-    raise ValueError("AWS Environment variables not set properly")
+S3_MULTIPART_PART_SIZE = int(os.getenv("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024)))
+S3_MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", "4"))
+S3_MIN_PART_SIZE = 5 * 1024 * 1024  # S3 rejects smaller parts except the last one
+S3_CONTENT_PREFIX = os.getenv("S3_CONTENT_PREFIX", "audio/")
+S3_PRESIGN_EXPIRY = int(os.getenv("S3_PRESIGN_EXPIRY", "3600"))  # 1 hour
+S3_PRESIGN_REFRESH_MARGIN = int(os.getenv("S3_PRESIGN_REFRESH_MARGIN", "300"))
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+_claim_lock = threading.Lock()
+
+
+class PresignedUrlCache:
+    """
+    Reuses presigned GET URLs until they are close to expiry.
+
+    A URL is handed out again as long as it stays valid for at least `refresh_margin`
+    seconds, so a player that receives it always has time to fetch the object; after
+    that it is re-signed ahead of its actual expiry. Stable URLs also let the browser
+    cache the audio across reruns.
+    """
+
+    def __init__(
+        self,
+        expires_in: int = S3_PRESIGN_EXPIRY,
+        refresh_margin: int = S3_PRESIGN_REFRESH_MARGIN,
+        max_entries: int = 10_000,
+    ):
+        self.expires_in = expires_in
+        self.refresh_margin = min(refresh_margin, expires_in // 2)
+        self.max_entries = max_entries
+        self._urls = OrderedDict()  # key -> (url, expires_at)
+        self._lock = threading.Lock()
+
+    def _sign(self, s3_file_name: str) -> Tuple[str, float]:
+        expires_at = time.time() + self.expires_in
+        with metrics.span("s3_presign"):
+            url = get_s3_client().generate_presigned_url(
+                "get_object",
+                Params={"Bucket": AWS_S3_BUCKET_NAME, "Key": s3_file_name},
+                ExpiresIn=self.expires_in,
+            )
+        return url, expires_at
+
+    def get(self, s3_file_name: str) -> str:
+        """Returns a presigned URL for the key, signing a new one only when needed."""
+        return self.get_many([s3_file_name])[s3_file_name]
+
+    def get_many(self, s3_file_names: Iterable[str]) -> Dict[str, str]:
+        """Returns presigned URLs for many keys at once, e.g. a whole playlist."""
+        now = time.time()
+        urls = {}
+        with self._lock:
+            for s3_file_name in s3_file_names:
+                entry = self._urls.get(s3_file_name)
+                if entry is None or entry[1] - now < self.refresh_margin:
+                    entry = self._sign(s3_file_name)
+                    self._urls[s3_file_name] = entry
+                    metrics.increment("s3_presign_cache_total", result="miss")
+                else:
+                    metrics.increment("s3_presign_cache_total", result="hit")
+                self._urls.move_to_end(s3_file_name)
+                urls[s3_file_name] = entry[0]
+            while len(self._urls) > self.max_entries:
+                self._urls.popitem(last=False)
+        return urls
 
-session = boto3.Session(
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION_NAME,
-)
 
-s3 = session.client("s3")
+presigned_urls = PresignedUrlCache()
 
 
 def generate_presigned_url(s3_file_name: str) -> str:
     """
     Generates a presigned URL for an S3 object allowing temporary access without AWS credentials.
 
+    URLs come from a cache and are reused until they get close to expiry.
+
     Args:
         s3_file_name (str): The key name of the S3 object for which to generate the presigned URL.
 
     Returns:
         str: The generated presigned URL as a string.
     """
-    signed_url = s3.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": AWS_S3_BUCKET_NAME, "Key": s3_file_name},
-        ExpiresIn=3600,  # expires in 1 hour
-    )
-    return signed_url
+    return presigned_urls.get(s3_file_name)
+
+
+def generate_presigned_urls(s3_file_names: Iterable[str]) -> Dict[str, str]:
+    """
+    Generates presigned URLs for several S3 objects in one call, e.g. a whole playlist.
+
+    Args:
+        s3_file_names: The key names of the S3 objects.
+
+    Returns:
+        Dict[str, str]: The presigned URL for each key name.
+    """
+    return presigned_urls.get_many(s3_file_names)
+
+
+def content_key(audio_stream) -> str:
+    """
+    Derives the S3 file name for an audio stream from a SHA-256 hash of its content.
+
+    The stream is read in blocks and rewound afterwards, so it can be uploaded next.
+
+    Args:
+        audio_stream: The audio stream (seekable file-like object) to hash.
+
+    Returns:
+        str: The content-addressed S3 file name, e.g. `audio/<sha256>.mp3`.
+    """
+    digest = hashlib.sha256()
+    start = audio_stream.tell()
+    for block in iter(lambda: audio_stream.read(_HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    audio_stream.seek(start)
+    return _digest_key(digest)
+
+
+def _digest_key(digest) -> str:
+    return f"{S3_CONTENT_PREFIX}{digest.hexdigest()}.mp3"
+
+
+def object_exists(s3_file_name: str) -> bool:
+    """
+    Checks whether an object already exists in the bucket with a single HEAD request.
+
+    Args:
+        s3_file_name (str): The key name of the S3 object.
+
+    Returns:
+        bool: True if the object exists, False if it does not.
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        get_s3_client().head_object(Bucket=AWS_S3_BUCKET_NAME, Key=s3_file_name)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def _upload_deduplicated(audio_stream, rehearsal_id: str = "", claimed: dict = None) -> Tuple[str, bool]:
+    with metrics.span("s3_upload") as span:
+        s3_file_name, skipped = _upload_once(audio_stream, rehearsal_id, claimed)
+        span.labels["skipped"] = skipped
+    return s3_file_name, skipped
+
+
+def _upload_once(audio_stream, rehearsal_id: str, claimed: dict) -> Tuple[str, bool]:
+    if not hasattr(audio_stream, "seek"):
+        audio_stream = BytesIO(audio_stream.read())
+    s3_file_name = content_key(audio_stream)
+    if claimed is None:
+        return _put_if_missing(audio_stream, rehearsal_id, s3_file_name)
+
+    # Within a batch only the first copy of some audio goes to S3; later copies wait for
+    # that upload and share its outcome, including its failure
+    with _claim_lock:
+        upload = claimed.get(s3_file_name)
+        first = upload is None
+        if first:
+            upload = claimed[s3_file_name] = Future()
+    if not first:
+        upload.result()
+        return s3_file_name, True
+    try:
+        result = _put_if_missing(audio_stream, rehearsal_id, s3_file_name)
+    except BaseException as e:
+        upload.set_exception(e)
+        raise
+    upload.set_result(result)
+    return result
+
+
+def _put_if_missing(audio_stream, rehearsal_id: str, s3_file_name: str) -> Tuple[str, bool]:
+    if object_exists(s3_file_name):
+        return s3_file_name, True
+
+    extra_args = {"ContentType": "audio/mpeg"}
+    if rehearsal_id:
+        extra_args["Metadata"] = {"rehearsal-id": rehearsal_id}
+    get_s3_client().upload_fileobj(audio_stream, AWS_S3_BUCKET_NAME, s3_file_name, ExtraArgs=extra_args)
+    return s3_file_name, False
 
 
 def upload_audiostream_to_s3(audio_stream, rehearsal_id= "") -> str:
     """
-    Uploads an audio stream to an S3 bucket.
+    Uploads an audio stream to an S3 bucket under a content-addressed key.
+
+    The key is derived from a hash of the audio, so uploading the same audio twice is
+    idempotent: if the object already exists the upload is skipped after one HEAD request.
 
     Args:
         audio_stream: The audio stream (file-like object) to be uploaded.
-        rehearsal_id: The ID generated for that particular rehearsal, used as the unique ID unless something breaks
+        rehearsal_id: The ID generated for that particular rehearsal, stored as object metadata
+
+    Returns:
+        str: The S3 file name under which the audio stream was saved.
+    """
+    s3_file_name, _ = _upload_deduplicated(audio_stream, rehearsal_id)
+    return s3_file_name
+
+
+def upload_rehearsals_to_s3(
+    rehearsals: Iterable[Tuple[str, object]],
+    max_concurrency: int = S3_MULTIPART_CONCURRENCY,
+) -> List[dict]:
+    """
+    Uploads many rehearsals concurrently, skipping audio that is already in the bucket.
+
+    Args:
+        rehearsals: Pairs of (rehearsal_id, audio), where audio is bytes or a file-like object.
+        max_concurrency (int): The maximum number of uploads in flight.
 
     Returns:
-        str: The unique S3 file name under which the audio stream was saved.
+        List[dict]: One report per rehearsal, in input order, with `rehearsal_id`,
+            `s3_file_name`, `skipped` (already present) and `error` (None on success).
     """
-    s3_file_name = f"{rehearsal_id}.mp3"
-    if len(rehearsal_id) < 6 or type(s3_file_name != str):
-        s3_file_name = f"{uuid.uuid4()}.mp3"  # Generates a unique file name using UUID
-    s3.upload_fileobj(audio_stream, AWS_S3_BUCKET_NAME, s3_file_name)
 
-    return s3_file_name
\ No newline at end of file
+    claimed = {}  # content key -> Future of its first upload
+
+    def upload(rehearsal_id: str, audio) -> dict:
+        report = {"rehearsal_id": rehearsal_id, "s3_file_name": None, "skipped": False, "error": None}
+        try:
+            if isinstance(audio, (bytes, bytearray, memoryview)):
+                audio = BytesIO(audio)
+            report["s3_file_name"], report["skipped"] = _upload_deduplicated(audio, rehearsal_id, claimed)
+        except Exception as e:
+            report["error"] = str(e)
+        return report
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [executor.submit(upload, rehearsal_id, audio) for rehearsal_id, audio in rehearsals]
+        return [future.result() for future in futures]
+
+
+def upload_chunks_to_s3(
+    chunks: Iterable[bytes],
+    s3_file_name: str,
+    part_size: int = S3_MULTIPART_PART_SIZE,
+    max_concurrency: int = S3_MULTIPART_CONCURRENCY,
+    s3_client=None,
+    bucket: str = AWS_S3_BUCKET_NAME,
+) -> str:
+    """
+    Uploads audio to S3 straight from a chunk iterator, as a concurrent multipart upload.
+
+    Chunks are collected into parts of `part_size` bytes and each full part is uploaded on
+    a worker thread while the iterator keeps producing, so synthesis and upload overlap.
+    At most `max_concurrency` parts are in flight, which bounds memory to roughly
+    `(max_concurrency + 1) * part_size`. Audio that never fills a part is sent with a
+    single PUT instead. If anything fails the multipart upload is aborted, so no orphaned
+    parts are left behind, and the error is re-raised.
+
+    Args:
+        chunks: The audio chunks, e.g. the iterator returned by the synthesis call.
+        s3_file_name (str): The key to store the object under.
+        part_size (int): The size of each part; S3 requires at least 5 MiB.
+        max_concurrency (int): The maximum number of parts uploaded at once.
+        s3_client: The boto3 S3 client to use, defaults to the shared client.
+        bucket (str): The bucket to upload to.
+
+    Returns:
+        str: The S3 file name under which the audio was saved.
+    """
+    client = s3_client or get_s3_client()
+    part_size = max(part_size, S3_MIN_PART_SIZE)
+    slots = threading.BoundedSemaphore(max_concurrency)
+    upload_id = None
+    futures = []
+    buffer = bytearray()
+
+    def upload_part(part_number: int, body: bytes) -> dict:
+        try:
+            with metrics.span("s3_upload_part"):
+                response = client.upload_part(
+                    Bucket=bucket,
+                    Key=s3_file_name,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body,
+                )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                buffer += chunk
+                while len(buffer) >= part_size:
+                    if upload_id is None:
+                        upload_id = client.create_multipart_upload(
+                            Bucket=bucket, Key=s3_file_name, ContentType="audio/mpeg"
+                        )["UploadId"]
+                    body = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    slots.acquire()
+                    futures.append(executor.submit(upload_part, len(futures) + 1, body))
+                    # Fail fast instead of synthesizing the rest for an upload that is lost
+                    for future in futures:
+                        if future.done() and future.exception():
+                            raise future.exception()
+
+            if upload_id is None:
+                client.put_object(
+                    Bucket=bucket,
+                    Key=s3_file_name,
+                    Body=bytes(buffer),
+                    ContentType="audio/mpeg",
+                )
+                return s3_file_name
+
+            if buffer:
+                slots.acquire()
+                futures.append(executor.submit(upload_part, len(futures) + 1, bytes(buffer)))
+                buffer.clear()
+
+            parts = [future.result() for future in futures]
+            client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=s3_file_name,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            if upload_id is not None:
+                try:
+                    client.abort_multipart_upload(
+                        Bucket=bucket, Key=s3_file_name, UploadId=upload_id
+                    )
+                except Exception as e:
+                    print(f"Failed to abort multipart upload {upload_id}: {str(e)}")
+            raise
+
+    return s3_file_name
+
+
+def upload_stream_to_s3(chunks: Iterable[bytes], rehearsal_id: str = "") -> str:
+    """
+    Uploads audio to its content-addressed key while it is still being produced.
+
+    Chunks are collected until they fill one multipart part. Audio that ends before that
+    (most rehearsals: a part holds over 20 minutes of `mp3_22050_32`) takes the usual path
+    of `upload_audiostream_to_s3`: hash, one HEAD, and a PUT only if the object is missing.
+
+    Longer audio cannot wait for its content key, which is only known after the last chunk,
+    so from the first full part on the chunks are streamed with `upload_chunks_to_s3` to a
+    temporary key while they are hashed. The object is then copied to `audio/<sha256>.mp3`
+    inside S3 (or dropped if that object already exists). Either way the final key is the
+    one `upload_audiostream_to_s3` would have used for the same audio.
+
+    Args:
+        chunks: The audio chunks, e.g. `ChunkBuffer.iter_chunks()` of a running capture.
+        rehearsal_id: The ID of the rehearsal, stored as object metadata.
+
+    Returns:
+        str: The S3 file name under which the audio was saved.
+    """
+    chunks = iter(chunks)
+    head = bytearray()
+    part_size = max(S3_MULTIPART_PART_SIZE, S3_MIN_PART_SIZE)
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= part_size:
+            break
+    else:
+        s3_file_name, _ = _upload_deduplicated(BytesIO(bytes(head)), rehearsal_id)
+        return s3_file_name
+
+    digest = hashlib.sha256()
+
+    def hashed():
+        for chunk in itertools.chain((bytes(head),), chunks):
+            digest.update(chunk)
+            yield chunk
+
+    client = get_s3_client()
+    staging_name = f"{S3_CONTENT_PREFIX}incoming/{uuid.uuid4().hex}.mp3"
+    with metrics.span("s3_upload", streamed=True) as span:
+        upload_chunks_to_s3(hashed(), staging_name, part_size=part_size)
+        s3_file_name = _digest_key(digest)
+        try:
+            skipped = object_exists(s3_file_name)
+            span.labels["skipped"] = skipped
+            if not skipped:
+                extra_args = {"Metadata": {"rehearsal-id": rehearsal_id}} if rehearsal_id else {}
+                client.copy_object(
+                    Bucket=AWS_S3_BUCKET_NAME,
+                    Key=s3_file_name,
+                    CopySource={"Bucket": AWS_S3_BUCKET_NAME, "Key": staging_name},
+                    ContentType="audio/mpeg",
+                    MetadataDirective="REPLACE",
+                    **extra_args,
+                )
+        finally:
+            client.delete_object(Bucket=AWS_S3_BUCKET_NAME, Key=staging_name)
+    return s3_file_name
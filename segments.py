@@ -0,0 +1,284 @@
+"""
+Library of recurring script blocks (opening breath-work, closing lines, ...) rendered once.
+
+A segment is a named block of text that opens ("intro") or closes ("outro") rehearsals.
+Its audio is synthesized the first time it is needed and kept next to the rehearsal
+library, outside the LRU synthesis cache, so it is never evicted. When a script starts or
+ends with segment texts, only the text in between is synthesized and the stored segment
+audio is spliced around it on MP3 frame boundaries.
+
+Segments are defined in `<REHEARSALS_DATA_DIR>/segments/segments.json` or through
+`REHEARSAL_INTRO_TEXT` / `REHEARSAL_OUTRO_TEXT`.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from mp3_index import audio_frames, build_index, id3v2_size
+from synthesis_cache import synthesis_key
+
+load_dotenv()
+
+REHEARSALS_DATA_DIR = os.getenv("REHEARSALS_DATA_DIR", "data")
+REHEARSAL_INTRO_TEXT = os.getenv("REHEARSAL_INTRO_TEXT", "")
+REHEARSAL_OUTRO_TEXT = os.getenv("REHEARSAL_OUTRO_TEXT", "")
+
+INTRO = "intro"
+OUTRO = "outro"
+
+_WORD = re.compile(r"\S+")
+
+
+def _skip_id3(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Drops a leading ID3v2 tag from a chunk stream, so it can follow other audio."""
+    head = b""
+    chunks = iter(chunks)
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= 10 or not b"ID3".startswith(head[:3]):
+            break
+    size = id3v2_size(head)
+    while len(head) < size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        head += chunk
+    if head[size:]:
+        yield head[size:]
+    yield from chunks
+
+
+class SegmentLibrary:
+    """
+    Named intro and outro blocks with their audio rendered once and stored on disk.
+
+    Audio files are named after the segment and the synthesis cache key of its text and
+    voice parameters, so editing a segment's text or changing the voice, model, output
+    format or voice settings renders it again on next use instead of splicing stale audio.
+
+    Args:
+        directory (str): Where definitions and audio are kept.
+        synthesize: Callable returning the audio chunks for a text.
+        voice (dict): The parameters `synthesize` passes to the TTS API besides the text
+            (voice_id, model_id, output_format, voice_settings, ...).
+    """
+
+    def __init__(self, directory: str = None, synthesize: Callable[[str], Iterable[bytes]] = None,
+                 voice: Optional[dict] = None):
+        self.directory = directory or os.path.join(REHEARSALS_DATA_DIR, "segments")
+        self.synthesize = synthesize
+        self.voice = voice or {}
+        self.definitions_path = os.path.join(self.directory, "segments.json")
+        self._segments: Dict[str, dict] = {}  # name -> {"text", "position"}
+        self._audio: Dict[str, bytes] = {}  # audio file name -> audio
+        self._rendering: Dict[str, threading.Lock] = {}  # audio file name -> lock held while rendering it
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        if os.path.exists(self.definitions_path):
+            with open(self.definitions_path, encoding="utf-8") as f:
+                self._segments = json.load(f)
+        for name, position, text in ((INTRO, INTRO, REHEARSAL_INTRO_TEXT), (OUTRO, OUTRO, REHEARSAL_OUTRO_TEXT)):
+            if text.strip() and name not in self._segments:
+                self._segments[name] = {"text": text.strip(), "position": position}
+
+    def define(self, name: str, text: str, position: str = INTRO):
+        """
+        Adds or replaces a segment and saves the definitions.
+
+        Args:
+            name (str): The segment name.
+            text (str): The exact text the segment speaks.
+            position (str): Whether it opens (`intro`) or closes (`outro`) a rehearsal.
+        """
+        if position not in (INTRO, OUTRO):
+            raise ValueError(f"Unknown segment position {position!r}")
+        with self._lock:
+            self._segments[name] = {"text": text.strip(), "position": position}
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._segments, f, indent=2)
+            os.replace(tmp_path, self.definitions_path)
+
+    def segments(self, position: str) -> Dict[str, str]:
+        """Returns the text of every segment at a position, keyed by name."""
+        return {
+            name: segment["text"]
+            for name, segment in self._segments.items()
+            if segment["position"] == position
+        }
+
+    def compose(self, body: str) -> str:
+        """Wraps a script body in the intro and outro segments."""
+        return "\n\n".join(
+            [*self.segments(INTRO).values(), body.strip(), *self.segments(OUTRO).values()]
+        )
+
+    def wrap(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Splices every intro and outro segment around audio chunks; the audio side of `compose`."""
+        return self.splice(list(self.segments(INTRO)), chunks, list(self.segments(OUTRO)))
+
+    def units(self, position: str) -> List[Tuple[str, int]]:
+        """Returns the (text, frame count) of every segment at a position, in `wrap` order."""
+        return [
+            (text, len(build_index(self.audio(name))))
+            for name, text in self.segments(position).items()
+        ]
+
+    def audio_path(self, name: str) -> str:
+        text = self._segments[name]["text"]
+        digest = synthesis_key(**self.voice, text=text)[:16]
+        return os.path.join(self.directory, f"{name}-{digest}.mp3")
+
+    def audio(self, name: str) -> bytes:
+        """
+        Returns the audio of a segment, synthesizing and storing it on first use.
+
+        Rendering holds a lock for that audio file only, so concurrent first uses of one
+        segment synthesize it once while other segments stay available.
+        """
+        path = self.audio_path(name)
+        with self._lock:
+            audio = self._audio.get(path)
+            if audio is not None:
+                return audio
+            rendering = self._rendering.setdefault(path, threading.Lock())
+        with rendering:
+            with self._lock:
+                audio = self._audio.get(path)
+            if audio is not None:
+                return audio
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+            except FileNotFoundError:
+                audio = b"".join(chunk for chunk in self.synthesize(self._segments[name]["text"]) if chunk)
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp_path, path)
+            with self._lock:
+                self._audio[path] = audio
+                self._rendering.pop(path, None)
+            return audio
+
+    def split(self, text: str) -> Tuple[List[str], str, List[str]]:
+        """
+        Finds the segments a script starts and ends with.
+
+        Segment texts are matched word for word, ignoring differences in whitespace.
+
+        Returns:
+            Tuple[List[str], str, List[str]]: The intro segment names in order, the text
+                between them, and the outro segment names in order.
+        """
+        spans = [match.span() for match in _WORD.finditer(text)]
+        words = [text[start:end] for start, end in spans]
+        first, last = 0, len(words)
+
+        intro = []
+        matched = True
+        while matched:
+            matched = False
+            for name, segment_text in self.segments(INTRO).items():
+                segment_words = segment_text.split()
+                if segment_words and words[first:first + len(segment_words)] == segment_words \
+                        and first + len(segment_words) <= last:
+                    intro.append(name)
+                    first += len(segment_words)
+                    matched = True
+                    break
+
+        outro = []
+        matched = True
+        while matched:
+            matched = False
+            for name, segment_text in self.segments(OUTRO).items():
+                segment_words = segment_text.split()
+                if segment_words and last - len(segment_words) >= first \
+                        and words[last - len(segment_words):last] == segment_words:
+                    outro.insert(0, name)
+                    last -= len(segment_words)
+                    matched = True
+                    break
+
+        if first >= last:
+            middle = ""
+        else:
+            middle = text[spans[first][0]:spans[last - 1][1]]
+        return intro, middle, outro
+
+    def synthesize_script(
+        self, text: str, synthesize: Optional[Callable[[str], Iterable[bytes]]] = None
+    ) -> Iterable[bytes]:
+        """
+        Synthesizes a script, reusing stored audio for its intro and outro segments.
+
+        Only the text between the segments goes to `synthesize`; its chunks are relayed as
+        they arrive between the stored segment audio (see `splice`).
+
+        Args:
+            text (str): The whole script.
+            synthesize: Callable returning the audio chunks for the novel text; defaults
+                to the library's synthesize function.
+
+        Returns:
+            Iterable[bytes]: The spliced audio chunks, in order.
+        """
+        synthesize = synthesize or self.synthesize
+        intro, middle, outro = self.split(text)
+        if not intro and not outro:
+            return synthesize(text)
+        return self.splice(intro, synthesize(middle) if middle else (), outro)
+
+    def splice(self, intro: List[str], chunks: Iterable[bytes], outro: List[str]) -> Iterator[bytes]:
+        """
+        Yields the audio of the intro segments, then `chunks` as they arrive, then the audio
+        of the outro segments. Only the first part keeps its tags; everything after it
+        contributes just its audio frames, so the result is one continuous MP3 stream.
+        """
+        saved = sum(len(self._segments[name]["text"]) for name in intro + outro)
+        metrics.increment("segment_characters_saved_total", saved)
+
+        first = True
+        for name in intro:
+            audio = self.audio(name)
+            yield audio if first else audio_frames(audio)
+            first = False
+        for chunk in (chunks if first else _skip_id3(chunks)):
+            yield chunk
+            first = False
+        for name in outro:
+            audio = self.audio(name)
+            yield audio if first else audio_frames(audio)
+            first = False
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_segment_library(
+    synthesize: Callable[[str], Iterable[bytes]] = None, voice: Optional[dict] = None
+) -> SegmentLibrary:
+    """
+    Returns the process-wide segment library, opening it on first use.
+
+    Args:
+        synthesize: Callable that renders segment audio; only used when the library is
+            created, so segments are always spoken with the app's voice.
+        voice (dict): The TTS parameters `synthesize` uses besides the text; only used
+            when the library is created.
+    """
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = SegmentLibrary(synthesize=synthesize, voice=voice)
+    return _library
@@ -1,10 +1,114 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import os
+import random
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import Optional
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from typing import TYPE_CHECKING, Iterator, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+import metrics
+
+if TYPE_CHECKING:
+    import spotipy
+
+load_dotenv()
+
+SPOTIFY_API_BASE_URL = os.getenv("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1")
+HTTP_POOL_SIZE = int(os.getenv("SPOTIFY_HTTP_POOL_SIZE", "10"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("SPOTIFY_UPLOAD_MAX_ATTEMPTS", "5"))
+UPLOAD_TIMEOUT = (10, 300)  # (connect, read) seconds
+# Creating an episode is not idempotent, so only responses where the server certainly
+# did not create it are retried
+RETRY_STATUSES = {429, 503}
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+TOKEN_REFRESH_MARGIN = 60  # seconds before expiry a cached token is renewed
+LISTING_CACHE_TTL = int(os.getenv("SPOTIFY_LISTING_CACHE_TTL", "300"))  # seconds
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff delay for a retry attempt"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return min(max(float(value), 0.0), BACKOFF_CAP)
+    except ValueError:
+        pass
+    try:
+        return min(max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0), BACKOFF_CAP)
+    except (TypeError, ValueError):
+        return None
+
+
+def _connect_failed(error: requests.ConnectionError) -> bool:
+    """Tell whether a request failed before the connection was made, so nothing was sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying failure;
+    # connection refused and DNS errors are ConnectTimeoutError subclasses
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, ConnectTimeoutError)
+
+
+class MultipartBody:
+    """
+    A multipart/form-data request body that streams a file part without copying it.
+    
+    requests sends objects with a length and a read() method as a streamed body with
+    a proper Content-Length, so the audio goes out as memoryview slices of the caller's
+    buffer instead of being concatenated into one large payload.
+    """
+    
+    def __init__(self, fields: dict, file_field: str, filename: str, file_data,
+                 file_content_type: str = "audio/mpeg"):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{filename}"\r\nContent-Type: {file_content_type}\r\n\r\n'
+        ).encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        
+        self._parts = [memoryview(head), memoryview(file_data).cast("B"), memoryview(tail)]
+        self._length = sum(len(part) for part in self._parts)
+        self._part = 0
+        self._offset = 0
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def read(self, size: int = -1):
+        if size is None or size < 0:
+            chunks = []
+            while chunk := self.read(self._length):
+                chunks.append(chunk)
+            return b"".join(chunks)
+        while self._part < len(self._parts):
+            part = self._parts[self._part]
+            if self._offset < len(part):
+                chunk = part[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                return chunk
+            self._part += 1
+            self._offset = 0
+        return memoryview(b"")
+
 
 class SpotifyPodcastHandler:
     def __init__(self, show_name="rehearsals"):
@@ -19,65 +123,147 @@ class SpotifyPodcastHandler:
         self.show_name = show_name
         self.show_id = os.getenv("SPOTIFY_SHOW_ID")
         
-        try:
-            # Initialize Spotify client with client credentials flow
-            auth_manager = SpotifyClientCredentials()
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
-            
-            # Test the connection
-            self.sp.show(self.show_id)
-        except Exception as e:
-            raise ConnectionError(f"Failed to initialize Spotify client: {str(e)}")
+        # The Spotify client is created on first use (see `sp`), not here
+        self._sp = None
+        self._connect_lock = threading.Lock()
+        self._cache = {}  # key -> (expires_at, value)
+        self._cache_lock = threading.Lock()
         
         # API endpoint for episode upload (not part of spotipy)
-        self.base_url = "https://api.spotify.com/v1/shows"
+        self.base_url = f"{SPOTIFY_API_BASE_URL.rstrip('/')}/shows"
+        
+        # Pooled HTTP session reused across uploads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    @property
+    def sp(self) -> "spotipy.Spotify":
+        """The spotipy client, connected and verified on first access"""
+        if self._sp is None:
+            with self._connect_lock:
+                if self._sp is None:
+                    # spotipy is only imported once a client is actually needed
+                    import spotipy
+                    from spotipy.oauth2 import SpotifyClientCredentials
+                    
+                    try:
+                        # Initialize Spotify client with client credentials flow
+                        auth_manager = SpotifyClientCredentials()
+                        sp = spotipy.Spotify(auth_manager=auth_manager)
+                        
+                        # Test the connection, keeping the answer for get_show_details
+                        self._cache_set("show", sp.show(self.show_id))
+                    except Exception as e:
+                        raise ConnectionError(f"Failed to initialize Spotify client: {str(e)}")
+                    self._sp = sp
+        return self._sp
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _cache_set(self, key, value):
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + LISTING_CACHE_TTL, value)
+
+    def invalidate_cache(self):
+        """Drop cached show and episode listings, e.g. after publishing an episode"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _access_token(self, force_refresh: bool = False) -> str:
+        """Return the cached access token, only asking spotipy for a new one near expiry"""
+        with self._token_lock:
+            if (
+                force_refresh
+                or self._token is None
+                or self._token.get("expires_at", 0) - time.time() < TOKEN_REFRESH_MARGIN
+            ):
+                self._token = self.sp.auth_manager.get_access_token(check_cache=not force_refresh)
+            return self._token["access_token"]
 
     def upload_episode(self, audio_data: bytes, title: str, description: str) -> Optional[str]:
         """
         Upload a new episode to the Spotify podcast
         
+        The audio is streamed as a multipart/form-data file part straight from the given
+        buffer (no copies), over a pooled session. Since creating an episode is not
+        idempotent, only failures where the episode cannot have been created are retried
+        (connection not established, 429 and 503), with jittered exponential backoff
+        honouring Retry-After.
+        
         Args:
-            audio_data: Binary audio data
+            audio_data: Binary audio data (bytes or memoryview)
             title: Episode title
             description: Episode description
             
         Returns:
             str: Episode ID if successful, None if failed
         """
+        with metrics.span("spotify_upload") as span:
+            episode_id = self._upload_episode(audio_data, title, description)
+            span.labels["outcome"] = "ok" if episode_id else "failed"
+        return episode_id
+
+    def _upload_episode(self, audio_data, title: str, description: str) -> Optional[str]:
         try:
-            # Get the current access token from spotipy
-            token = self.sp.auth_manager.get_access_token()
-            
             # Endpoint for episode upload
             upload_url = f"{self.base_url}/{self.show_id}/episodes"
             
-            # Headers using the token from spotipy
-            headers = {
-                "Authorization": f"Bearer {token['access_token']}",
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
-            
             # Prepare episode metadata
             episode_data = {
                 "name": title,
                 "description": description,
                 "language": "en",
-                "audio": audio_data,
                 "publish_date": datetime.now().isoformat(),
             }
             
-            # Make the upload request
-            response = requests.post(
-                upload_url,
-                headers=headers,
-                data=episode_data
-            )
+            token_refreshed = False
+            for attempt in range(UPLOAD_MAX_ATTEMPTS):
+                body = MultipartBody(episode_data, "audio", "episode.mp3", audio_data)
+                headers = {
+                    "Authorization": f"Bearer {self._access_token()}",
+                    "Content-Type": body.content_type,
+                }
+                try:
+                    response = self.session.post(
+                        upload_url,
+                        headers=headers,
+                        data=body,
+                        timeout=UPLOAD_TIMEOUT
+                    )
+                except requests.ConnectionError as e:
+                    # The upload may have been accepted if the connection broke after it was sent
+                    if not _connect_failed(e) or attempt == UPLOAD_MAX_ATTEMPTS - 1:
+                        raise
+                    print(f"Upload attempt {attempt + 1} failed: {str(e)}")
+                    metrics.increment("spotify_upload_retries_total", reason="connection")
+                    time.sleep(_backoff(attempt))
+                    continue
+                
+                if response.status_code == 201:
+                    self.invalidate_cache()
+                    return response.json().get('id')
+                if response.status_code == 401 and not token_refreshed:
+                    # The token was revoked or expired early; fetch a new one once
+                    self._access_token(force_refresh=True)
+                    token_refreshed = True
+                    continue
+                if response.status_code not in RETRY_STATUSES or attempt == UPLOAD_MAX_ATTEMPTS - 1:
+                    break
+                metrics.increment("spotify_upload_retries_total", reason=response.status_code)
+                delay = _retry_after(response)
+                time.sleep(delay if delay is not None else _backoff(attempt))
             
-            if response.status_code == 201:
-                return response.json().get('id')
-            else:
-                print(f"Upload failed with status {response.status_code}: {response.text}")
-                return None
+            print(f"Upload failed with status {response.status_code}: {response.text}")
+            return None
                 
         except Exception as e:
             print(f"Error uploading episode: {str(e)}")
@@ -90,18 +276,51 @@ class SpotifyPodcastHandler:
         return None
     
     def get_show_details(self) -> dict:
-        """Get details about the podcast show"""
+        """Get details about the podcast show (cached for a few minutes)"""
         try:
-            return self.sp.show(self.show_id)
+            show = self._cache_get("show")
+            if show is None:
+                show = self.sp.show(self.show_id)
+                self._cache_set("show", show)
+            return show
         except Exception as e:
             print(f"Error getting show details: {str(e)}")
             return {}
     
-    def get_episodes(self, limit: int = 50) -> list:
-        """Get list of episodes in the show"""
+    def iter_episodes(self, page_size: int = 50) -> Iterator[dict]:
+        """Iterate over every episode in the show, fetching one page at a time"""
+        results = self.sp.show_episodes(self.show_id, limit=page_size)
+        while results:
+            yield from results.get('items', [])
+            results = self.sp.next(results) if results.get('next') else None
+    
+    def get_episodes(self, limit: Optional[int] = None) -> list:
+        """Get list of episodes in the show, all of them unless limited (cached for a few minutes)"""
         try:
-            results = self.sp.show_episodes(self.show_id, limit=limit)
-            return results.get('items', [])
+            key = ("episodes", limit)
+            episodes = self._cache_get(key)
+            if episodes is None:
+                episodes = list(islice(self.iter_episodes(), limit))
+                self._cache_set(key, episodes)
+            return episodes
         except Exception as e:
             print(f"Error getting episodes: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def get_spotify_handler() -> SpotifyPodcastHandler:
+    """
+    Return the process-wide SpotifyPodcastHandler, shared by every session.
+    
+    Creating it does not touch the network; the Spotify client connects on first use.
+    """
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                _handler = SpotifyPodcastHandler()
+    return _handler
\ No newline at end of file
@@ -1,55 +1,63 @@
 import streamlit as st
 import uuid
 from datetime import datetime
-import json
-from io import BytesIO
-from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
-import os
+import html
+import itertools
 from dotenv import load_dotenv
-from spotify_handler import SpotifyPodcastHandler
+from clients import get_elevenlabs_client, get_spotify_handler, s3_configured
+import s3_uploader
+from synthesis_cache import cached_convert
+from audio_streaming import get_audio_server, get_browser_audio_server
+from chunk_buffer import start_capture
+from rehearsal_store import get_rehearsal_store
+from segments import INTRO, OUTRO, get_segment_library
+from text_to_speech_stream import voice_params
+from jobs import DONE, ENHANCING, FAILED, SAVING, SYNTHESIZING, UPLOADING, get_job_manager
+from enhancer import EnhancementPipeline, get_enhancer
+from publish import publish, s3_destination, spotify_destination
+from resynthesis import resynthesize, units_from_frames
+from mp3_index import build_index
+from playlist import PlaylistCache, neighbours, session_chunks, render_session
+import metrics
 
-# load env vars and set up ElevenLabs
+# load env vars; API clients are created lazily and shared by all sessions (see clients.py)
 load_dotenv()
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-if not ELEVENLABS_API_KEY:
-    raise ValueError("ELEVENLABS_API_KEY environment variable not set")
-client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
 
-# Initialize Spotify Handler
+# Initialize Spotify Handler (shared by all sessions, connects lazily on first use)
 if 'spotify_handler' not in st.session_state:
     try:
-        st.session_state.spotify_handler = SpotifyPodcastHandler()
+        st.session_state.spotify_handler = get_spotify_handler()
     except Exception as e:
         print(f"Error initializing Spotify handler: {str(e)}")
         st.session_state.spotify_handler = None
 
-def text_to_speech_stream(text: str) -> BytesIO:
-    """Generate speech from text using ElevenLabs API"""
-    response = client.text_to_speech.convert(
-        voice_id="pNInz6obpgDQGcFmaJgB",  # Adam voice
-        optimize_streaming_latency="0",
-        output_format="mp3_22050_32",
-        text=text,
-        model_id="eleven_multilingual_v2",
-        voice_settings=VoiceSettings(
-            stability=0.0,
-            similarity_boost=1.0,
-            style=0.0,
-            use_speaker_boost=True,
-        ),
-    )
-    
-    audio_stream = BytesIO()
-    for chunk in response:
-        if chunk:
-            audio_stream.write(chunk)
-    audio_stream.seek(0)
-    return audio_stream
-
-# Initialize session state for storing rehearsals if not exists
+def synthesize(text: str):
+    """Request speech for one piece of text, returning the lazy chunk iterator"""
+    return cached_convert(get_elevenlabs_client(), text=text, **voice_params())
+
+# Each browser session has its own library; its ID is kept in the URL so a reload keeps it
+if 'library_id' not in st.session_state:
+    st.session_state.library_id = st.query_params.get('library') or str(uuid.uuid4())
+    st.query_params['library'] = st.session_state.library_id
+
+# Initialize session state with the lightweight metadata of this library's rehearsals;
+# transcripts and audio stay on disk until they are shown or played
 if 'rehearsals' not in st.session_state:
-    st.session_state.rehearsals = {}
+    st.session_state.rehearsals = {
+        rehearsal['id']: rehearsal
+        for rehearsal in get_rehearsal_store().list(owner=st.session_state.library_id)
+    }
+
+# The Prometheus endpoint is served by the audio server, so start it up front
+if metrics.METRICS_SINK == "prometheus":
+    try:
+        get_audio_server()
+    except OSError as e:
+        print(f"Metrics endpoint unavailable: {str(e)}")
+
+# Each listener prefetches the rehearsals around the one they are on
+if 'playlist_cache' not in st.session_state:
+    st.session_state.playlist_cache = PlaylistCache()
 
 if 'current_screen' not in st.session_state:
     st.session_state.current_screen = 'create'
@@ -57,6 +65,259 @@ if 'current_screen' not in st.session_state:
 def generate_id():
     return str(uuid.uuid4())
 
+def presigned_audio_urls(rehearsals: list) -> dict:
+    """Sign playback URLs for every uploaded rehearsal in one batch, keyed by rehearsal ID"""
+    # S3 is optional: without credentials audio is served from the local rehearsal store
+    if not s3_configured():
+        return {}
+    keys = {r['id']: r['s3_key'] for r in rehearsals if r.get('s3_key')}
+    urls = s3_uploader.generate_presigned_urls(keys.values())
+    return {rehearsal_id: urls[key] for rehearsal_id, key in keys.items()}
+
+def rehearsal_stages(prompt: str) -> list:
+    """Build the background job stages that design a rehearsal from a prompt and voice a draft of it"""
+
+    def design_stage(job):
+        job.message = "Designing rehearsal and generating voiceover..."
+        library = get_segment_library(synthesize, voice_params())
+        # Completed sentences are voiced while the enhancer is still writing the rest
+        enhancement = EnhancementPipeline(get_enhancer().enhance(prompt), synthesize)
+        job.result['enhancement'] = enhancement
+        response = metrics.timed_chunks("tts_script", library.wrap(enhancement), chunked=True)
+        # Capture the audio in the background and play it while it is still arriving
+        capture = start_capture(response)
+        job.result['capture'] = capture
+        try:
+            server = get_browser_audio_server()
+            if server:
+                job.result['stream_url'] = server.register(capture)
+        except OSError as e:
+            print(f"Progressive playback unavailable: {str(e)}")
+        capture.wait()
+        job.result['enhanced_text'] = library.compose(enhancement.text)
+
+    return [(ENHANCING, design_stage)]
+
+def draft_units(enhancement, audio_data: bytes) -> list:
+    """Map the text of a designed draft, including its intro and outro, to the byte ranges of its audio"""
+    library = get_segment_library(synthesize, voice_params())
+    units = library.units(INTRO) + enhancement.units + library.units(OUTRO)
+    return units_from_frames(units, build_index(audio_data))
+
+def complete_stages(design_job, text: str, spotify_handler, owner: str) -> list:
+    """
+    Build the background job stages that save a designed rehearsal and publish it.
+
+    `text` is the script as edited by the user, or None to keep the draft's script.
+    The enhancer must have finished writing the draft; its voiceover may still be running.
+    """
+    enhancement = design_job.result['enhancement']
+    capture = design_job.result['capture']
+    draft_text = get_segment_library(synthesize, voice_params()).compose(enhancement.text)
+    edited = text is not None and " ".join(text.split()) != " ".join(draft_text.split())
+    rehearsal = {
+        'id': generate_id(),
+        'created_at': datetime.now().isoformat(),
+        'owner': owner,
+        'title': " ".join(enhancement.text.split()[:4]),
+        'content': text if edited else draft_text,
+    }
+    audio = {'data': capture}
+
+    def save(job):
+        job.message = "Saving rehearsal..."
+        audio_data = capture.wait()
+        units = draft_units(enhancement, audio_data)
+        if edited:
+            # Only the edited sentences are voiced again; the rest of the draft audio is kept
+            job.message = "Regenerating changed sentences..."
+            audio_data, units = resynthesize(text, synthesize, audio_data, units)
+        audio['data'] = audio_data
+        rehearsal['units'] = units
+        job.state = SAVING
+        job.result['enhanced_text'] = rehearsal['content']
+        job.result['rehearsal'] = get_rehearsal_store().add(rehearsal, audio_data)
+        # The draft is saved: its job need not keep the audio and script in memory any longer
+        design_job.result.pop('capture', None)
+        design_job.result.pop('enhancement', None)
+
+    if edited:
+        return [(SYNTHESIZING, save), (UPLOADING, publish_stage(rehearsal, audio, spotify_handler))]
+    # An unedited draft starts streaming to S3 while its voiceover may still be finishing
+    return [(UPLOADING, publish_stage(rehearsal, audio, spotify_handler, save=save))]
+
+def regenerate_stages(rehearsal_id: str, text: str, owner: str) -> list:
+    """
+    Build the background job stages that re-voice an edited script, re-rendering only changed sentences.
+
+    The new audio replaces the stored audio and is published to S3 again. Spotify has no way
+    to replace an episode's audio, so the rehearsal keeps its existing episode rather than
+    gaining a duplicate.
+    """
+    store = get_rehearsal_store()
+    rehearsal = {}
+    audio = {}
+
+    def resynthesize_stage(job):
+        job.message = "Regenerating changed sentences..."
+        previous = store.get(rehearsal_id)
+        if previous is None or previous.get('owner') != owner:
+            raise ValueError("This rehearsal no longer exists in your library")
+        audio['data'], units = resynthesize(
+            text, synthesize, store.load_audio(rehearsal_id), previous.get('units')
+        )
+        # The new version replaces the old one; it is uploaded to S3 again below
+        rehearsal.update(previous, content=text, units=units, s3_key=None)
+        job.state = SAVING
+        job.result['enhanced_text'] = text
+        job.result['rehearsal'] = store.add(rehearsal, audio['data'])
+        if previous.get('spotify_episode_id'):
+            job.result['warning'] = "The Spotify episode still has the previous voiceover"
+
+    return [(SYNTHESIZING, resynthesize_stage), (UPLOADING, publish_stage(rehearsal, audio, None))]
+
+def publish_stage(rehearsal: dict, audio: dict, spotify_handler, save=None):
+    """
+    Build the job stage that publishes a rehearsal's audio.
+
+    `audio['data']` is the audio, or the capture still producing it. If `save` is given it
+    stores the rehearsal; the S3 upload runs meanwhile, and Spotify starts once it is saved.
+    A failed save is reported as such (the job is in the SAVING state), not as a failed upload.
+    """
+
+    def run(job):
+        # S3 and Spotify upload in parallel from the same audio buffer
+        uploads = iter(())
+        if s3_configured():
+            uploads = publish(audio['data'], {'S3': s3_destination(rehearsal['id'])})
+        if save:
+            save(job)
+            job.state = UPLOADING
+        destinations = ['S3'] if s3_configured() else []
+        if spotify_handler:
+            destinations.append('Spotify')
+            uploads = itertools.chain(uploads, publish(audio['data'], {
+                'Spotify': spotify_destination(spotify_handler, rehearsal['title'], rehearsal['content'])
+            }))
+        if not destinations:
+            return
+        job.message = f"Uploading to {' and '.join(destinations)}..."
+        warnings = [job.result['warning']] if job.result.get('warning') else []
+        # Each destination's result is stored as it finishes
+        for result in uploads:
+            job.timings[f"{result.destination} upload"] = result.seconds
+            if not result.ok:
+                warnings.append(f"Upload to {result.destination} failed")
+            elif result.destination == 'S3':
+                job.result['rehearsal'] = get_rehearsal_store().update(
+                    rehearsal['id'], s3_key=result.value
+                )
+            else:
+                job.result['rehearsal'] = get_rehearsal_store().update(
+                    rehearsal['id'],
+                    spotify_episode_id=result.value,
+                    spotify_url=spotify_handler.get_episode_url(result.value)
+                )
+        if warnings:
+            job.result['warning'] = "; ".join(warnings)
+
+    return run
+
+# What each job stage does, for progress and error messages
+STAGE_ACTIONS = {
+    ENHANCING: "designing the rehearsal",
+    SYNTHESIZING: "generating the voiceover",
+    SAVING: "saving the rehearsal",
+    UPLOADING: "publishing",
+}
+
+def show_voiceover_job(job_id: str, polling: bool = False):
+    """Render the state of a rehearsal job; as a polling fragment it reruns the app once done"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return
+    if polling and job.finished:
+        st.rerun()
+
+    # The script appears as the enhancer writes it, and can be edited once the job is done
+    enhancement = job.result.get('enhancement')
+    enhanced_text = job.result.get('enhanced_text') or (enhancement.text if enhancement else "")
+    saved = 'rehearsal' in job.result
+    if job.state == DONE and not polling:
+        edited_text = st.text_area(
+            "Enhanced rehearsal", value=enhanced_text, height=200, key=f"script_{job.id}"
+        )
+        if not saved:
+            # A designed draft is only saved and published once the user confirms it (and
+            # only once: completing it releases the draft)
+            if enhancement is not None and st.button(
+                "Complete and Generate Voiceover",
+                type="primary",
+                use_container_width=True,
+                disabled=not edited_text.strip()
+            ):
+                new_job = get_job_manager().submit(
+                    f"Complete: {' '.join(enhancement.text.split()[:4])}",
+                    complete_stages(
+                        job, edited_text, st.session_state.spotify_handler, st.session_state.library_id
+                    )
+                )
+                st.session_state.voiceover_job_id = new_job.id
+                st.rerun()
+        elif st.button(
+            "Regenerate voiceover",
+            use_container_width=True,
+            disabled=edited_text.strip() == enhanced_text.strip() or not edited_text.strip()
+        ):
+            rehearsal = job.result['rehearsal']
+            new_job = get_job_manager().submit(
+                f"Regenerate: {rehearsal['title']}",
+                regenerate_stages(rehearsal['id'], edited_text, st.session_state.library_id)
+            )
+            st.session_state.voiceover_job_id = new_job.id
+            st.rerun()
+    elif enhanced_text:
+        st.text_area("Enhanced rehearsal", value=enhanced_text, height=200)
+        # Once the script is written it can be completed as is, while its voiceover finishes
+        if job.state == ENHANCING and enhancement is not None and enhancement.done and st.button(
+            "Complete and Generate Voiceover", type="primary", use_container_width=True
+        ):
+            new_job = get_job_manager().submit(
+                f"Complete: {' '.join(enhancement.text.split()[:4])}",
+                complete_stages(job, None, st.session_state.spotify_handler, st.session_state.library_id)
+            )
+            st.session_state.voiceover_job_id = new_job.id
+            st.rerun()
+
+    if job.result.get('stream_url'):
+        st.audio(job.result['stream_url'], format='audio/mp3', autoplay=True)
+    elif job.state == DONE and not saved and job.result.get('capture'):
+        # Without a reachable audio endpoint the finished draft is sent through Streamlit
+        st.audio(job.result['capture'].getvalue(), format='audio/mp3')
+
+    timings = ", ".join(f"{state} {seconds:.1f}s" for state, seconds in job.timings.items())
+    if job.state == FAILED and saved:
+        # Stages after saving only publish; the rehearsal itself is kept
+        st.warning(
+            f"Rehearsal saved, but {STAGE_ACTIONS.get(job.failed_stage, job.failed_stage)} failed: "
+            f"{job.error}. Find it under Playback."
+        )
+    elif job.state == FAILED:
+        st.error(f"Error {STAGE_ACTIONS.get(job.failed_stage, job.failed_stage)}: {job.error}")
+    elif job.state == DONE and not saved:
+        st.info("Listen to the draft and edit the script if needed, then complete it to save and publish.")
+    elif job.state == DONE:
+        spotify_url = job.result['rehearsal'].get('spotify_url')
+        if job.result.get('warning'):
+            st.warning(job.result['warning'])
+        elif spotify_url:
+            st.success(f"Successfully uploaded to Spotify! Listen here: {spotify_url}")
+        st.success("Rehearsal created successfully! Find it under Playback.")
+    else:
+        st.info(f"{job.message or job.state.capitalize()} ({job.elapsed:.0f}s)")
+    if timings:
+        st.caption(timings)
+
 def create_rehearsal_screen():
     st.title("Create rehearsal")
     
@@ -65,6 +326,17 @@ def create_rehearsal_screen():
         st.session_state.current_screen = 'play'
         st.rerun()
     
+    # Pick up the result of a finished voiceover job
+    job = None
+    if st.session_state.get('voiceover_job_id'):
+        job = get_job_manager().get(st.session_state.voiceover_job_id)
+        if job is None:
+            del st.session_state.voiceover_job_id
+        elif job.finished and 'rehearsal' in job.result:
+            # Regenerated rehearsals replace their previous version
+            rehearsal = job.result['rehearsal']
+            st.session_state.rehearsals[rehearsal['id']] = get_rehearsal_store().summary(rehearsal)
+    
     # Form for rehearsal creation
     with st.form("rehearsal_form"):
         rehearsal_text = st.text_area(
@@ -74,7 +346,7 @@ def create_rehearsal_screen():
         )
         
         # Track whether we're in edit mode
-        is_editing = 'enhanced_text' not in st.session_state
+        is_editing = job is None
         
         if is_editing:
             submit_label = "Design rehearsal"
@@ -86,80 +358,26 @@ def create_rehearsal_screen():
             design_submitted = st.form_submit_button(
                 submit_label,
                 type="primary",
-                use_container_width=True
+                use_container_width=True,
+                disabled=job is not None and not job.finished
             )
         
-        # Handle design submission
+        # Handle design submission: enhancement and a draft voiceover run as one background
+        # job, with synthesis starting as soon as the enhancer has written its first sentence
         if design_submitted and rehearsal_text:
-            # Simulate LLM enhancement
-            enhanced_text = f"Enhanced: {rehearsal_text}"
-            st.session_state.enhanced_text = enhanced_text
+            job = get_job_manager().submit(
+                f"Rehearsal: {' '.join(rehearsal_text.split()[:4])}",
+                rehearsal_stages(rehearsal_text)
+            )
+            st.session_state.voiceover_job_id = job.id
             st.rerun()
     
-    # Show enhanced text and completion button if we have processed text
-    if 'enhanced_text' in st.session_state:
-        st.text_area(
-            "Enhanced rehearsal",
-            value=st.session_state.enhanced_text,
-            height=200,
-            key="enhanced_output"
-        )
-        # Add a progress message placeholder
-        progress_placeholder = st.empty()
-        
-        if st.button(
-            "Complete and Generate Voiceover",
-            type="primary",
-            use_container_width=True
-        ):
-            try:
-                progress_placeholder.text("Generating voiceover...")
-                
-                # Generate audio using ElevenLabs
-                audio_stream = text_to_speech_stream(st.session_state.enhanced_text)
-                
-                # Create new rehearsal object
-                rehearsal_id = generate_id()
-                
-                # Initialize rehearsal object
-                rehearsal = {
-                    'id': rehearsal_id,
-                    'title': st.session_state.enhanced_text.split()[:4],
-                    'content': st.session_state.enhanced_text,
-                    'created_at': datetime.now().isoformat(),
-                    'audio_data': audio_stream.getvalue()
-                }
-
-                # Handle Spotify upload if available
-                if st.session_state.spotify_handler:
-                    try:
-                        progress_placeholder.text("Uploading to Spotify...")
-                        episode_id = st.session_state.spotify_handler.upload_episode(
-                            audio_data=audio_stream.getvalue(),
-                            title=" ".join(st.session_state.enhanced_text.split()[:4]),
-                            description=st.session_state.enhanced_text
-                        )
-                        if episode_id:
-                            episode_url = st.session_state.spotify_handler.get_episode_url(episode_id)
-                            rehearsal['spotify_episode_id'] = episode_id
-                            rehearsal['spotify_url'] = episode_url
-                            progress_placeholder.success(f"Successfully uploaded to Spotify! Listen here: {episode_url}")
-                    except Exception as e:
-                        progress_placeholder.error(f"Error uploading to Spotify: {str(e)}")
-                
-                # Store the rehearsal in session state
-                st.session_state.rehearsals[rehearsal_id] = rehearsal
-                
-                # Clear the session state for next creation
-                del st.session_state.enhanced_text
-                
-                # Update progress and switch screens
-                progress_placeholder.text("Rehearsal created successfully!")
-                st.session_state.current_screen = 'play'
-                st.rerun()
-
-            except Exception as e:
-                progress_placeholder.error(f"Error creating rehearsal: {str(e)}")
+    # Show progress of the current rehearsal job, polling only while it runs
+    if job is not None:
+        if job.finished:
+            show_voiceover_job(job.id)
+        else:
+            st.fragment(show_voiceover_job, run_every=1)(job.id, polling=True)
 
 def play_rehearsal_screen():
     st.title("Play rehearsal")
@@ -181,6 +399,36 @@ def play_rehearsal_screen():
         st.session_state.current_rehearsal_index = 0
     
     current_rehearsal = rehearsals[st.session_state.current_rehearsal_index]
+    audio_urls = presigned_audio_urls(rehearsals)
+
+    try:
+        server = get_browser_audio_server()
+    except OSError as e:
+        print(f"Local audio endpoint unavailable: {str(e)}")
+        server = None
+
+    # Prefer URLs so the browser fetches (and caches) the audio itself: a presigned S3 URL,
+    # else the local range-capable audio endpoint
+    playlist = st.session_state.playlist_cache
+    rehearsal_ids = [rehearsal['id'] for rehearsal in rehearsals]
+    nearby = neighbours(rehearsal_ids, st.session_state.current_rehearsal_index, playlist.radius)
+    nearby_urls = {
+        rehearsal_id: audio_urls.get(rehearsal_id) or (server and server.file_url(rehearsal_id))
+        for rehearsal_id in nearby
+    }
+    if all(nearby_urls.values()):
+        # Have the browser preload the neighbours so Previous/Next start at once
+        playlist.focus(rehearsal_ids, st.session_state.current_rehearsal_index, prefetch=False)
+        preloads = "".join(
+            f'<audio preload="auto" src="{html.escape(url)}"></audio>'
+            for rehearsal_id, url in nearby_urls.items()
+            if rehearsal_id != current_rehearsal['id']
+        )
+        if preloads:
+            st.html(preloads)
+    else:
+        # Audio is sent through Streamlit: load the neighbours in the background instead
+        playlist.focus(rehearsal_ids, st.session_state.current_rehearsal_index)
     
     # Create columns for navigation and player
     col1, col2, col3 = st.columns([1, 3, 1])
@@ -197,10 +445,23 @@ def play_rehearsal_screen():
     with col2:
         # Display current rehearsal
         st.markdown(
-            f"<h2 style='text-align: center;'>{' '.join(current_rehearsal['title'])}...</h2>",
+            f"<h2 style='text-align: center;'>{current_rehearsal['title']}...</h2>",
             unsafe_allow_html=True
         )
         
+        # Duration comes from the MP3 frame index stored with the rehearsal
+        duration = current_rehearsal.get('duration') or 0
+        start_at = 0
+        if duration >= 1:
+            st.caption(f"Duration {int(duration // 60)}:{int(duration % 60):02d}")
+            start_at = st.slider(
+                "Start at (seconds)",
+                min_value=0,
+                max_value=int(duration),
+                value=0,
+                key=f"start_at_{current_rehearsal['id']}"
+            )
+        
         # Center the play controls
         _, play_col, stop_col, _ = st.columns([2, 1, 1, 2])
         
@@ -216,8 +477,16 @@ def play_rehearsal_screen():
                 "⏸️ Pause" if st.session_state.is_playing else "▶️ Play",
                 use_container_width=True
             ):
-                # Check if audio data exists
-                if 'audio_data' in current_rehearsal:
+                # Only if there is no URL are the bytes loaded and sent through Streamlit
+                audio_source = nearby_urls[current_rehearsal['id']]
+                start_time = start_at
+                if not audio_source:
+                    item = playlist.get(current_rehearsal['id'])
+                    if item:
+                        # Seek on a frame boundary so only the rest of the audio is sent
+                        audio_source = item.audio[item.index.byte_offset(start_at):] if start_at else item.audio
+                        start_time = 0
+                if audio_source:
                     try:
                         st.session_state.is_playing = not st.session_state.is_playing
                         
@@ -226,9 +495,9 @@ def play_rehearsal_screen():
                             message_placeholder.empty()
                             # Display audio player
                             audio_placeholder.audio(
-                                current_rehearsal['audio_data'],
+                                audio_source,
                                 format='audio/mp3',
-                                start_time=0
+                                start_time=start_time
                             )
                         else:
                             # Clear audio player when paused
@@ -247,6 +516,19 @@ def play_rehearsal_screen():
                 st.session_state.is_playing = False
                 audio_placeholder.empty()
                 message_placeholder.empty()
+
+        # Play this and every following rehearsal back to back as one gapless stream
+        if st.button("🔁 Play all from here", use_container_width=True):
+            session_ids = rehearsal_ids[st.session_state.current_rehearsal_index:]
+            session_source = None
+            if server:
+                # Read from the library only as fast as the browser plays it
+                session_source = server.register_source(lambda: session_chunks(session_ids, playlist))
+            if not session_source:
+                session_source = render_session(session_ids, playlist)
+            st.session_state.is_playing = True
+            message_placeholder.empty()
+            audio_placeholder.audio(session_source, format='audio/mp3', autoplay=True)
     
     with col3:
         if st.button("Next ➡️"):
@@ -259,10 +541,11 @@ def play_rehearsal_screen():
     
     # Display rehearsal content
     st.markdown("### Transcript")
-    st.write(current_rehearsal['content'])
+    details = get_rehearsal_store().get(current_rehearsal['id']) or {}
+    st.write(details.get('content', ''))
 
     # Display Spotify link if available
-    if 'spotify_url' in current_rehearsal:
+    if current_rehearsal.get('spotify_url'):
         st.markdown(f"[Listen on Spotify]({current_rehearsal['spotify_url']})")
 
 # Main app logic
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+from tts_scheduler import INTERACTIVE, get_scheduler
+
+load_dotenv()
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_CACHE_SUFFIX = ".mp3"
+
+
+def _as_plain(value):
+    """Converts SDK models (e.g. VoiceSettings) into plain JSON-serialisable values."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "dict"):
+        return value.dict()
+    if hasattr(value, "__dict__"):
+        return vars(value)
+    return value
+
+
+def synthesis_key(**params) -> str:
+    """
+    Builds the content address for a synthesis request.
+
+    Every keyword passed to `client.text_to_speech.convert` (text, voice_id, model_id,
+    output_format, voice_settings, ...) takes part in the hash, so two requests share a
+    key only if they would produce the same audio.
+
+    Returns:
+        str: A hex SHA-256 digest identifying the request.
+    """
+    canonical = json.dumps(
+        {name: _as_plain(value) for name, value in params.items()},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SynthesisCache:
+    """
+    Size-bounded on-disk store of synthesized audio, evicted least-recently-used first.
+
+    Entries are written to a temporary file and moved into place with `os.replace`, so a
+    reader never sees a half-written file. Recency survives restarts because hits bump the
+    file's modification time, which is what the index is rebuilt from.
+    """
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{_CACHE_SUFFIX}")
+
+    def _load_index(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(_CACHE_SUFFIX):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name[: -len(_CACHE_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str, count: bool = True) -> Optional[bytes]:
+        """
+        Returns the cached audio for `key`, or None on a miss.
+
+        Args:
+            key (str): The synthesis key.
+            count (bool): Whether the lookup counts towards the hit and miss statistics.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += count
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                # Removed behind our back (another process evicted it)
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += count
+                return None
+            self._entries.move_to_end(key)
+            self.hits += count
+            return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Atomically stores `data` under `key` and evicts old entries to stay within budget.
+        """
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current size of the store."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SynthesisCache:
+    """Returns the process-wide synthesis cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SynthesisCache()
+    return _cache
+
+
+def cached_convert(
+    client, cache: Optional[SynthesisCache] = None, lane: int = INTERACTIVE, **params
+) -> Iterator[bytes]:
+    """
+    Drop-in replacement for `client.text_to_speech.convert` backed by the synthesis cache.
+
+    On a hit the stored audio is yielded as a single chunk. On a miss the request goes
+    upstream through the shared TTS scheduler (rate limits, priority lanes, coalescing of
+    identical requests in flight) and the chunks are passed through as they arrive. The
+    scheduler's leader for the key caches the complete audio once the upstream response has
+    finished, whether or not this caller reads it to the end; failed responses are never
+    cached.
+
+    Args:
+        client: The ElevenLabs client used on a cache miss.
+        cache: The cache to use, defaults to the process-wide cache.
+        lane: The scheduler lane, `tts_scheduler.INTERACTIVE` or `tts_scheduler.BATCH`.
+        **params: The keyword arguments for `client.text_to_speech.convert`.
+
+    Yields:
+        bytes: Chunks of audio data.
+    """
+    cache = cache or get_cache()
+    key = synthesis_key(**params)
+
+    audio = cache.get(key)
+    metrics.increment("tts_cache_requests_total", result="miss" if audio is None else "hit")
+    if audio is not None:
+        yield audio
+        return
+
+    response = get_scheduler().stream(
+        key,
+        lambda: client.text_to_speech.convert(**params),
+        characters=len(params.get("text", "")),
+        lane=lane,
+        lookup=lambda: cache.get(key, count=False),
+        store=lambda audio: cache.put(key, audio),
+    )
+    for chunk in metrics.timed_chunks("tts_request", response, model=params.get("model_id")):
+        if chunk:
+            yield chunk
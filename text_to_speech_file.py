@@ -1,20 +1,12 @@
-import os
 import uuid
 
 from dotenv import load_dotenv
-from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
 
-load_dotenv()
-
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-
-if not ELEVENLABS_API_KEY:
-    raise ValueError("ELEVENLABS_API_KEY environment variable not set")
+from clients import get_elevenlabs_client
+import metrics
+from synthesis_cache import cached_convert
 
-client = ElevenLabs(
-    api_key=ELEVENLABS_API_KEY,
-)
+load_dotenv()
 
 
 def text_to_speech_file(text: str) -> str:
@@ -31,8 +23,11 @@ def text_to_speech_file(text: str) -> str:
     Returns:
         str: The file path where the audio file has been saved.
     """
+    from elevenlabs import VoiceSettings
+
     # Calling the text_to_speech conversion API with detailed parameters
-    response = client.text_to_speech.convert(
+    response = cached_convert(
+        get_elevenlabs_client(),
         voice_id="pNInz6obpgDQGcFmaJgB",  # Adam pre-made voice
         optimize_streaming_latency="0",
         output_format="mp3_22050_32",
@@ -51,7 +46,7 @@ def text_to_speech_file(text: str) -> str:
     # Writing the audio stream to the file
 
     with open(save_file_path, "wb") as f:
-        for chunk in response:
+        for chunk in metrics.timed_chunks("tts_script", response, chunked=False):
             if chunk:
                 f.write(chunk)
 
@@ -1,24 +1,73 @@
-import os
 from io import BytesIO
-from typing import IO
+from typing import IO, Iterator
 
 from dotenv import load_dotenv
-from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
+
+from chunked_synthesis import split_text, synthesize_chunked
+from clients import get_elevenlabs_client
+import metrics
+from segments import get_segment_library
+from synthesis_cache import cached_convert
+from tts_scheduler import INTERACTIVE
 
 load_dotenv()
 
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
-if not ELEVENLABS_API_KEY:
-    raise ValueError("ELEVENLABS_API_KEY environment variable not set")
+def voice_params() -> dict:
+    """
+    Returns the TTS request parameters besides the text: voice, model, output format and
+    voice settings. They take part in the synthesis cache key and the segment file names.
+    """
+    from elevenlabs import VoiceSettings
+
+    return dict(
+        voice_id="pNInz6obpgDQGcFmaJgB",  # Adam pre-made voice
+        optimize_streaming_latency="0",
+        output_format="mp3_22050_32",
+        model_id="eleven_multilingual_v2",
+        voice_settings=VoiceSettings(
+            stability=0.0,
+            similarity_boost=1.0,
+            style=0.0,
+            use_speaker_boost=True,
+        ),
+    )
+
+
+def synthesize(text: str, lane: int = INTERACTIVE):
+    """
+    Requests speech for a single piece of text and returns the lazy chunk iterator.
+
+    Args:
+        text (str): The text content to be converted into speech.
+        lane (int): The TTS scheduler lane, `INTERACTIVE` or `BATCH`.
+
+    Returns:
+        Iterator[bytes]: The audio chunks as they arrive from the API (or the cache).
+    """
+    return cached_convert(get_elevenlabs_client(), lane=lane, text=text, **voice_params())
+
 
-client = ElevenLabs(
-    api_key=ELEVENLABS_API_KEY,
-)
+def text_to_speech_chunks(text: str, chunked: bool = False, lane: int = INTERACTIVE) -> Iterator[bytes]:
+    """
+    Converts text to speech lazily, yielding the audio chunks as they become available.
 
+    Takes the same arguments as `text_to_speech_stream`, which collects these chunks.
+    """
+    def synthesize_lane(piece: str):
+        return synthesize(piece, lane)
 
-def text_to_speech_stream(text: str) -> IO[bytes]:
+    def synthesize_body(body: str):
+        if chunked:
+            return synthesize_chunked(split_text(body), synthesize_lane)
+        return synthesize_lane(body)
+
+    # Perform the text-to-speech conversion, reusing stored intro/outro segment audio
+    response = get_segment_library(synthesize, voice_params()).synthesize_script(text, synthesize_body)
+    return metrics.timed_chunks("tts_script", response, chunked=chunked)
+
+
+def text_to_speech_stream(text: str, chunked: bool = False, lane: int = INTERACTIVE) -> IO[bytes]:
     """
     Converts text to speech and returns the audio data as a byte stream.
 
@@ -26,26 +75,20 @@ def text_to_speech_stream(text: str) -> IO[bytes]:
     voice ID and various voice settings, to generate speech from the provided text. Instead of
     saving the output to a file, it streams the audio data into a BytesIO object.
 
+    Intro and outro segments from the segment library are not synthesized again; their
+    stored audio is spliced around the rest of the text.
+
     Args:
         text (str): The text content to be converted into speech.
+        chunked (bool): Split the text at sentence/paragraph boundaries and synthesize the
+            pieces concurrently, which is much faster for long scripts.
+        lane (int): The TTS scheduler lane; bulk jobs pass `BATCH` so interactive
+            requests are served first.
 
     Returns:
         IO[bytes]: A BytesIO stream containing the audio data.
     """
-    # Perform the text-to-speech conversion
-    response = client.text_to_speech.convert(
-        voice_id="pNInz6obpgDQGcFmaJgB",  # Adam pre-made voice
-        optimize_streaming_latency="0",
-        output_format="mp3_22050_32",
-        text=text,
-        model_id="eleven_multilingual_v2",
-        voice_settings=VoiceSettings(
-            stability=0.0,
-            similarity_boost=1.0,
-            style=0.0,
-            use_speaker_boost=True,
-        ),
-    )
+    response = text_to_speech_chunks(text, chunked, lane)
 
     print("Streaming audio data...")
 
@@ -0,0 +1,209 @@
+"""
+Shared admission control for upstream text-to-speech requests.
+
+Every synthesis request that misses the cache passes through one process-wide scheduler:
+
+- Token buckets cap the request rate and the character rate, and a slot limit caps the
+  number of concurrent requests, to stay inside the ElevenLabs plan's quotas.
+- Waiting requests are admitted by lane, interactive before batch, and in arrival order
+  within a lane, so a bulk render cannot starve a user waiting in the app.
+- Identical requests in flight at the same time are coalesced into one upstream call whose
+  chunks fan out to every caller as they arrive.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+from chunk_buffer import ChunkBuffer
+
+load_dotenv()
+
+TTS_MAX_CONCURRENT = int(os.getenv("TTS_MAX_CONCURRENT", "5"))
+TTS_REQUESTS_PER_SECOND = float(os.getenv("TTS_REQUESTS_PER_SECOND", "0"))  # 0 = unlimited
+TTS_REQUEST_BURST = int(os.getenv("TTS_REQUEST_BURST", "10"))
+TTS_CHARS_PER_SECOND = float(os.getenv("TTS_CHARS_PER_SECOND", "0"))  # 0 = unlimited
+TTS_CHARS_BURST = int(os.getenv("TTS_CHARS_BURST", "20000"))
+
+INTERACTIVE = 0
+BATCH = 1
+
+_LANE_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+
+class TokenBucket:
+    """
+    Refills at `rate` tokens per second up to `capacity`. A rate of 0 means unlimited.
+
+    Not thread-safe on its own; the scheduler calls it under its lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, amount: float) -> float:
+        """Returns how many seconds until `amount` tokens are available (0 if they are now)."""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        # A request larger than the bucket waits for a full bucket rather than forever
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        if self.rate:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+
+class TtsScheduler:
+    """
+    Admits upstream synthesis requests within the configured concurrency and rate limits.
+
+    Args:
+        max_concurrent (int): The maximum number of upstream requests streaming at once.
+        requests_per_second (float): The sustained request rate (0 for unlimited).
+        request_burst (int): How many requests may start back to back.
+        chars_per_second (float): The sustained character rate (0 for unlimited).
+        chars_burst (int): How many characters may be requested back to back.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = TTS_MAX_CONCURRENT,
+        requests_per_second: float = TTS_REQUESTS_PER_SECOND,
+        request_burst: int = TTS_REQUEST_BURST,
+        chars_per_second: float = TTS_CHARS_PER_SECOND,
+        chars_burst: int = TTS_CHARS_BURST,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.requests = TokenBucket(requests_per_second, request_burst)
+        self.characters = TokenBucket(chars_per_second, chars_burst)
+        self.active = 0
+        self._waiting = []  # heap of (lane, sequence)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._inflight: Dict[str, ChunkBuffer] = {}
+
+    @contextmanager
+    def slot(self, characters: int, lane: int = INTERACTIVE):
+        """
+        Blocks until a request of `characters` characters may go upstream, and holds a
+        concurrency slot for the duration of the block.
+        """
+        ticket = (lane, next(self._sequence))
+        queued_at = time.perf_counter()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                if self._waiting[0] == ticket and self.active < self.max_concurrent:
+                    delay = max(self.requests.delay(1), self.characters.delay(characters))
+                    if delay == 0:
+                        break
+                    self._condition.wait(delay)
+                else:
+                    self._condition.wait()
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            self.characters.take(characters)
+            self.active += 1
+            # The next in line may be admissible too
+            self._condition.notify_all()
+        metrics.observe("tts_queue_wait_seconds", time.perf_counter() - queued_at, lane=_LANE_NAMES[lane])
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify_all()
+
+    def stream(
+        self,
+        key: str,
+        request: Callable[[], Iterable[bytes]],
+        characters: int,
+        lane: int = INTERACTIVE,
+        lookup: Optional[Callable[[], Optional[bytes]]] = None,
+        store: Optional[Callable[[bytes], None]] = None,
+    ) -> Iterator[bytes]:
+        """
+        Runs an upstream request once per key, admitted by the scheduler, and returns its chunks.
+
+        The first caller for a key (the leader) starts the request on a background thread;
+        callers with the same key that arrive while it is in flight read the same chunks from
+        the start instead of making their own call. Only the leader stores the result, and it
+        does so before the key stops being in flight, so a caller that arrives in between finds
+        either the request in flight or the stored audio.
+
+        Args:
+            key (str): Identifies the request, e.g. its `synthesis_key`.
+            request: Callable that performs the upstream call and returns its chunk iterator.
+            characters (int): The characters the request is charged for.
+            lane (int): INTERACTIVE or BATCH.
+            lookup: Callable returning stored audio for the key, or None; checked by the
+                leader before it goes upstream.
+            store: Callable that stores the complete audio once the request has succeeded.
+
+        Returns:
+            Iterator[bytes]: The chunks as they arrive.
+        """
+        with self._condition:
+            buffer = self._inflight.get(key)
+            leader = buffer is None
+            if leader:
+                buffer = self._inflight[key] = ChunkBuffer()
+        if not leader:
+            metrics.increment("tts_coalesced_requests_total")
+            return buffer.iter_chunks()
+
+        def run():
+            try:
+                # Stored by a leader that finished after our caller's own lookup
+                audio = lookup() if lookup is not None else None
+                if audio is not None:
+                    buffer.feed((audio,))
+                    return
+                with self.slot(characters, lane):
+                    buffer.feed(request())
+                if store is not None:
+                    try:
+                        store(buffer.getvalue())
+                    except Exception as e:
+                        print(f"Error storing synthesized audio: {str(e)}")
+            except BaseException as e:
+                if not buffer.done:
+                    buffer.close(e)
+            finally:
+                with self._condition:
+                    self._inflight.pop(key, None)
+
+        threading.Thread(target=run, name="tts-request", daemon=True).start()
+        return buffer.iter_chunks()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> TtsScheduler:
+    """Returns the process-wide TTS scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = TtsScheduler()
+    return _scheduler